@@ -0,0 +1,53 @@
+"""
+Compare the per-message overhead of calling the deltabot_incoming_message
+hook through pluggy against the compiled simplebot.plugins.Plugins.call
+fast path.
+
+Usage: python benchmarks/bench_dispatch.py
+"""
+
+import logging
+import timeit
+
+import pluggy
+
+from simplebot.hookspec import SPEC_NAME, DeltaBotSpecs, deltabot_hookimpl
+from simplebot.plugins import Plugins
+
+
+class Plugin:
+    @deltabot_hookimpl
+    def deltabot_incoming_message(self, message, bot, replies):
+        return None
+
+
+def make_plugins(count: int) -> Plugins:
+    pm = pluggy.PluginManager(SPEC_NAME)
+    pm.add_hookspecs(DeltaBotSpecs)
+    plugins = Plugins(logging.getLogger("bench"), pm)
+    for i in range(count):
+        plugins.add_module(f"plugin{i}", Plugin())
+    return plugins
+
+
+def main() -> None:
+    print(f"{'plugins':>10} {'pluggy (us)':>12} {'fast (us)':>10} {'speedup':>8}")
+    for count in (2, 10, 50):
+        plugins = make_plugins(count)
+        kwargs = dict(message=None, bot=None, replies=None)
+        number = 20000
+        t_pluggy = timeit.timeit(
+            lambda: plugins.hook.deltabot_incoming_message(**kwargs), number=number
+        )
+        plugins.fast_dispatch = True
+        t_fast = timeit.timeit(
+            lambda: plugins.call("deltabot_incoming_message", **kwargs), number=number
+        )
+        t_pluggy, t_fast = t_pluggy / number * 1e6, t_fast / number * 1e6
+        print(
+            f"{count:>10} {t_pluggy:>12.2f} {t_fast:>10.2f} {t_pluggy / t_fast:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
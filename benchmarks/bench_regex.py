@@ -0,0 +1,44 @@
+"""
+Compare searching the filters' regex patterns one by one against
+the combined simplebot.utils.RegexSet matcher.
+
+Usage: python benchmarks/bench_regex.py
+"""
+
+import random
+import re
+import string
+import timeit
+
+from simplebot.utils import RegexSet
+
+
+def make_patterns(count: int) -> dict:
+    rnd = random.Random(count)
+    patterns = {}
+    for i in range(count):
+        word = "".join(rnd.choices(string.ascii_lowercase, k=rnd.randint(4, 8)))
+        patterns[f"filter{i}"] = re.compile(rf"\b{word}\b", re.IGNORECASE)
+    return patterns
+
+
+def naive(patterns: dict, text: str) -> set:
+    return {key for key, pattern in patterns.items() if pattern.search(text)}
+
+
+def main() -> None:
+    text = "Hello there, check https://example.org/some/page it is great " * 3
+    print(f"{'patterns':>10} {'naive (us)':>12} {'RegexSet (us)':>14} {'speedup':>8}")
+    for count in (10, 100, 1000):
+        patterns = make_patterns(count)
+        regex_set = RegexSet(patterns)
+        assert regex_set.match(text) == naive(patterns, text)
+        number = max(10, 20000 // count)
+        t_naive = timeit.timeit(lambda: naive(patterns, text), number=number)
+        t_set = timeit.timeit(lambda: regex_set.match(text), number=number)
+        t_naive, t_set = t_naive / number * 1e6, t_set / number * 1e6
+        print(f"{count:>10} {t_naive:>12.1f} {t_set:>14.1f} {t_naive / t_set:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
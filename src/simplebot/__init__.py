@@ -1,3 +1,4 @@
+from .annotations import annotation_decorator as annotation  # noqa
 from .bot import DeltaBot  # noqa
 from .commands import command_decorator as command  # noqa
 from .filters import filter_decorator as filter  # noqa
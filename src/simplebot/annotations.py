@@ -0,0 +1,131 @@
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+
+from .commands import CMD_PREFIX
+
+_annotations: Set[tuple] = set()
+URL_REGEX = re.compile(r"https?://[^\s<>\"']+", re.IGNORECASE)
+MENTION_REGEX = re.compile(r"(?<![\w.])@([\w.+-]+@[\w-]+(?:\.[\w-]+)+)")
+
+
+class Annotations:
+    """Registry of the annotations plugins can get from incoming messages."""
+
+    def __init__(self, bot) -> None:
+        self.logger = bot.logger
+        self._annotators: Dict[str, Callable] = OrderedDict()
+        self.register(name="urls", func=get_urls)
+        self.register(name="mentions", func=get_mentions)
+        self.register(name="command", func=get_command)
+
+    def register(self, func: Callable, name: str = None) -> None:
+        """register a function computing an annotation of incoming messages.
+
+        :param func: function accepting the message as its only argument and
+                     returning the annotation's value, it is only called the
+                     first time the annotation of a message is requested,
+                     the value is shared by all plugins and must not be
+                     modified.
+        :param name: name of the annotation, if not provided it is the function name.
+        """
+        name = name or func.__name__
+        if name in self._annotators:
+            raise ValueError(f"annotation {name!r} already registered")
+        self._annotators[name] = func
+        self.logger.debug(f"registered new annotation {name!r}")
+
+    def unregister(self, name: str) -> Callable:
+        """unregister an annotation function."""
+        return self._annotators.pop(name)
+
+    def dict(self) -> dict:
+        return self._annotators.copy()
+
+    def of(self, message) -> "MessageAnnotations":
+        """Get the annotations of the given message, attaching them to it
+        as `message.annotations` if needed.
+        """
+        annotations = getattr(message, "annotations", None)
+        if annotations is None:
+            annotations = MessageAnnotations(message, self._annotators)
+            message.annotations = annotations
+        return annotations
+
+
+class MessageAnnotations:
+    """Lazily computed and memoized annotations of a message.
+
+    Use ``message.annotations["urls"]`` to get an annotation.
+    """
+
+    def __init__(self, message, annotators: Dict[str, Callable]) -> None:
+        self.message = message
+        self._annotators = annotators
+        self._values: Dict[str, Any] = {}
+        # annotations can be requested from observer threads, reentrant
+        # so annotators can request other annotations
+        self._lock = threading.RLock()
+
+    def __getitem__(self, name: str) -> Any:
+        try:
+            return self._values[name]
+        except KeyError:
+            pass
+        with self._lock:
+            if name not in self._values:
+                self._values[name] = self._annotators[name](self.message)
+            return self._values[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._annotators
+
+    def get(self, name: str, default: Any = None) -> Any:
+        """Get the annotation or the default if there is no such annotation."""
+        if name not in self._annotators:
+            return default
+        return self[name]
+
+    def is_computed(self, name: str) -> bool:
+        """True if the annotation was already computed for this message."""
+        return name in self._values
+
+
+def get_urls(message) -> Tuple[str, ...]:
+    """URLs in the message text."""
+    return tuple(URL_REGEX.findall(message.text or ""))
+
+
+def get_mentions(message) -> Tuple[str, ...]:
+    """Addresses mentioned as @addr in the message text."""
+    return tuple(addr.rstrip(".") for addr in MENTION_REGEX.findall(message.text or ""))
+
+
+def get_command(message) -> Optional[Tuple[str, Tuple[str, ...], str]]:
+    """The (command name, arguments, payload) tokens of the message text,
+    or None if it is not a command.
+    """
+    text = message.text or ""
+    if not text.startswith(CMD_PREFIX):
+        return None
+    args = text.split()
+    payload = text.split(maxsplit=1)[1] if len(args) > 1 else ""
+    return args[0], tuple(args[1:]), payload
+
+
+def annotation_decorator(func: Callable = None, **kwargs) -> Callable:
+    """Register decorated function as a message annotation.
+
+    Check documentation of method `simplebot.annotations.Annotations.register`
+    to see all parameters the decorated function can accept.
+    """
+
+    def _decorator(func) -> Callable:
+        kwargs["func"] = func
+        _annotations.add(tuple(sorted(kwargs.items())))
+        return func
+
+    if func is None:
+        return _decorator
+    return _decorator(func)
@@ -0,0 +1,202 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from tempfile import NamedTemporaryFile
+from typing import Dict, Generator, Iterable, Set, Tuple
+
+from .ratelimit import TokenBucket
+from .utils import COPY_CHUNK_SIZE
+
+BLOBDIR_REF = re.compile(r"\$BLOBDIR/([^\n\r]+)")
+
+
+class BlobEntry:
+    __slots__ = ("path", "size", "refs")
+
+    def __init__(self, path: str, size: int) -> None:
+        self.path = path
+        self.size = size
+        self.refs = 0
+
+
+class BlobCache:
+    """Content-addressed cache of the attachments written to the blobdir.
+
+    Sending the same content with the same file name again reuses the blob
+    written the first time instead of writing a new copy. Blobs are
+    reference counted while their messages are being sent, the least
+    recently used unreferenced blobs are evicted when the cache grows over
+    `max_size` bytes.
+    """
+
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        # (digest, file name) -> entry, in least recently used order
+        self._entries: Dict[Tuple[str, str], BlobEntry] = OrderedDict()
+        self._paths: Dict[str, Tuple[str, str]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, fileobj, filename: str, blobdir: str) -> str:
+        """Store the rest of the file object in the blobdir, hashing it while
+        it is copied, and return the path of its blob.
+
+        The blob is referenced until :meth:`release` is called with its path.
+        """
+        prefix, suffix = split_filename(filename)
+        digest = hashlib.sha256()
+        size = 0
+        with NamedTemporaryFile(
+            dir=blobdir, prefix=prefix, suffix=suffix, delete=False
+        ) as fp:
+            while True:
+                chunk = fileobj.read(COPY_CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                fp.write(chunk)
+                size += len(chunk)
+            tmp_path = fp.name
+        key = (digest.hexdigest(), filename)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and os.path.exists(entry.path):
+                os.remove(tmp_path)
+                self.hits += 1
+                self._entries.move_to_end(key)  # type: ignore
+            else:
+                self.misses += 1
+                if entry is not None:
+                    # the blob was deleted from the blobdir
+                    self.size -= entry.size
+                path = os.path.join(blobdir, f"{prefix}{key[0][:16]}{suffix or ''}")
+                os.replace(tmp_path, path)
+                entry = self._entries[key] = BlobEntry(path, size)
+                self._paths[path] = key
+                self.size += size
+            entry.refs += 1
+            self._evict()
+            return entry.path
+
+    def release(self, path: str) -> None:
+        """Drop a reference to the blob with the given path."""
+        with self._lock:
+            key = self._paths.get(path)
+            if key is not None:
+                self._entries[key].refs -= 1
+                self._evict()
+
+    def _evict(self) -> None:
+        for key in list(self._entries):
+            if self.size <= self.max_size:
+                break
+            entry = self._entries[key]
+            if entry.refs > 0:
+                continue
+            del self._entries[key]
+            del self._paths[entry.path]
+            self.size -= entry.size
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+    def get_report(self) -> str:
+        return (
+            f"Blob cache: blobs={len(self._entries)} size={self.size / 2**20:.1f}MB"
+            f" max={self.max_size / 2**20:.1f}MB hits={self.hits} misses={self.misses}"
+        )
+
+
+def get_referenced_blobs(db_path: str) -> Set[str]:
+    """Return the names of the blobdir files referenced by the account's database."""
+    refs: Set[str] = set()
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        for query in (
+            "SELECT param FROM msgs",
+            "SELECT param FROM chats",
+            "SELECT param FROM contacts",
+            "SELECT value FROM config",
+        ):
+            try:
+                rows = conn.execute(query)
+            except sqlite3.OperationalError:
+                continue
+            for (value,) in rows:
+                if isinstance(value, str) and "$BLOBDIR/" in value:
+                    refs.update(BLOBDIR_REF.findall(value))
+    finally:
+        conn.close()
+    return refs
+
+
+def find_garbage_blobs(
+    blobdir: str, referenced: Set[str], min_age: float
+) -> Generator[Tuple[str, int], None, None]:
+    """Yield the (path, size) of the blobdir files not referenced by any
+    message and not modified in the last `min_age` seconds.
+    """
+    deadline = time.time() - min_age
+    with os.scandir(blobdir) as entries:
+        for entry in entries:
+            if entry.name in referenced or not entry.is_file(follow_symlinks=False):
+                continue
+            st = entry.stat(follow_symlinks=False)
+            if st.st_mtime <= deadline:
+                yield entry.path, st.st_size
+
+
+def delete_blobs(
+    blobs: Iterable[Tuple[str, int]], batch_size: int = 100, rate_limit=None
+) -> Tuple[int, int]:
+    """Delete the given (path, size) blobs in batches of `batch_size` files,
+    waiting between batches to delete at most `rate_limit` (calls, seconds)
+    files in the given time.
+
+    Returns the number of deleted files and the number of bytes reclaimed.
+    """
+    bucket = TokenBucket(*rate_limit) if rate_limit else None
+    count = reclaimed = 0
+    batch = []
+    for blob in blobs:
+        batch.append(blob)
+        if len(batch) >= batch_size:
+            deleted = _delete_batch(batch, bucket)
+            count += deleted[0]
+            reclaimed += deleted[1]
+            batch.clear()
+    if batch:
+        deleted = _delete_batch(batch, bucket)
+        count += deleted[0]
+        reclaimed += deleted[1]
+    return count, reclaimed
+
+
+def _delete_batch(batch: list, bucket) -> Tuple[int, int]:
+    count = reclaimed = 0
+    for path, size in batch:
+        if bucket is not None:
+            while not bucket.consume():
+                time.sleep(bucket.wait_time())
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            continue
+        count += 1
+        reclaimed += size
+    return count, reclaimed
+
+
+def split_filename(filename: str) -> tuple:
+    """Split a file name into the prefix and suffix used for its blobs."""
+    parts = filename.split(".", maxsplit=1)
+    if len(parts) == 2:
+        return parts[0] + "-", "." + parts[1]
+    return filename + "-", None
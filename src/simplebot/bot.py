@@ -1,8 +1,10 @@
+import inspect
 import json
 import os
 import threading
+from datetime import datetime
 from tempfile import NamedTemporaryFile
-from typing import Any, Generator, List, Optional, Union
+from typing import Any, Collection, Dict, Generator, List, Optional, Union
 
 import deltachat as dc
 import py
@@ -11,25 +13,44 @@ from deltachat.capi import lib
 from deltachat.events import FFIEvent
 from deltachat.message import parse_system_add_remove
 
+from .annotations import Annotations, _annotations
+from .blobcache import BlobCache, split_filename
+from .broadcast import Broadcaster
 from .builtin.admin import add_admin, del_admin, get_admins
 from .builtin.cmdline import PluginCmd
-from .commands import Commands, _cmds
+from .commands import CMD_PREFIX, Commands, _cmds
 from .filters import Filters, _filters
+from .latency import LatencyTracker
+from .media import ImageShrinker
+from .outbound import OutboundQueue
 from .plugins import Plugins, get_global_plugin_manager
+from .ratelimit import RateLimiter, SendLimiter
+from .scheduler import Scheduler
 from .templates import help_template
 from .utils import (
     StatusUpdateMessage,
+    copy_fileobj,
     parse_system_image_changed,
     parse_system_title_changed,
     set_builtin_avatar,
 )
 
+CHAT_GATES = ("commands", "muted")
+
 
 class Replies:
-    def __init__(self, message: Message, logger) -> None:
+    def __init__(self, message: Message, logger, outbound=None) -> None:
         self.incoming_message = message
         self.logger = logger
+        #: :class:`simplebot.outbound.OutboundQueue` sending the replies,
+        #: if None they are sent synchronously
+        self.outbound = outbound
+        #: name of the plugin whose handler is adding the replies
+        self.plugin: Optional[str] = None
         self._replies: List[tuple] = []
+        self._sent: List[Message] = []
+        self._closed = False
+        self._lock = threading.RLock()
 
     def has_replies(self) -> bool:
         return bool(self._replies)
@@ -45,6 +66,8 @@ class Replies:
         sender: str = None,
         quote: Message = None,
         chat: Chat = None,
+        coalesce: bool = True,
+        send_at: Union[datetime, float] = None,
     ) -> None:
         """Schedule a reply message.
 
@@ -60,6 +83,13 @@ class Replies:
         :param quote: a Message object the reply will quote.
         :param chat: the chat where the reply will be sent, default is the
                      same chat of the message that triggered this reply.
+        :param coalesce: if reply coalescing is enabled, plain text replies
+                         are merged with the consecutive plain text replies to
+                         the same chat into a single message, set it to False
+                         to always send this reply as a separate message.
+        :param send_at: a datetime or timestamp, if given the reply is saved
+                        in the bot's persistent outbox right away and sent at
+                        that time, see :meth:`DeltaBot.schedule_message`.
         """
         if bytefile:
             if not filename:
@@ -69,39 +99,158 @@ class Replies:
                     "if bytefile is specified, filename must a basename, not path"
                 )
 
-        self._replies.append(
-            (text, html, viewtype, filename, bytefile, sender, quote, chat)
-        )
+        if self._closed:
+            self.logger.debug("reply discarded, the replies object is closed")
+            return
 
-    def send_reply_messages(self) -> list:
-        l = []
-        for msg in self._send_replies_to_core():
-            self.logger.debug(
-                f"reply id={msg.id} chat={msg.chat} sent with text: {msg.text[:50]!r}"
+        if send_at is not None:
+            if self.outbound is None or self.outbound.scheduler is None:
+                raise ValueError("send_at needs the replies of a bot")
+            self.outbound.scheduler.schedule(
+                chat or self.incoming_message.chat,
+                send_at,
+                text,
+                html=html,
+                viewtype=viewtype,
+                filename=filename,
+                bytefile=bytefile,
+                sender=sender,
+                quote=quote,
             )
-            l.append(msg)
+            return
+
+        with self._lock:
+            if self._closed:
+                return
+            self._replies.append(
+                (
+                    text,
+                    html,
+                    viewtype,
+                    filename,
+                    bytefile,
+                    sender,
+                    quote,
+                    chat,
+                    coalesce,
+                    self.plugin,
+                )
+            )
+
+    def flush(self) -> list:
+        """Send the scheduled replies right away instead of waiting for the
+        message processing to finish.
+
+        Long running commands can use it to deliver partial results early.
+        Returns the list of sent messages, the replies handed off to the
+        outbound queue are not included.
+        """
+        l = []
+        with self._lock:
+            for msg in self._send_replies_to_core():
+                self.logger.debug(
+                    f"reply id={msg.id} chat={msg.chat} sent with text: {msg.text[:50]!r}"
+                )
+                l.append(msg)
+            self._sent.extend(l)
         return l
 
+    def close(self, text: str = None) -> None:
+        """Ignore the replies added from now on, the ones already added are
+        still sent.
+
+        Used when the handler adding the replies timed out and was abandoned
+        in its thread, `text` is added as the last reply before closing.
+        """
+        with self._lock:
+            if text:
+                self.add(text=text)
+            self._closed = True
+
+    def send_reply_messages(self) -> list:
+        """Send the scheduled replies, return all the messages sent with this
+        object, including the ones already sent with :meth:`flush`.
+        """
+        self.flush()
+        return list(self._sent)
+
+    def _stream(self, result):
+        """Send the replies of a generator handler as they are yielded.
+
+        The handler can yield the keyword arguments of :meth:`add` as a dict,
+        a text, or None to just flush the replies added so far.
+        Returns the generator's return value, or result itself if it is
+        not a generator.
+        """
+        if not inspect.isgenerator(result):
+            return result
+        while True:
+            try:
+                item = next(result)
+            except StopIteration as ex:
+                return ex.value
+            if self._closed:
+                result.close()
+                return None
+            if isinstance(item, dict):
+                self.add(**item)
+            elif item is not None:
+                self.add(text=str(item))
+            self.flush()
+
     def _send_replies_to_core(self) -> Generator[Message, None, None]:
-        for (
-            text,
-            html,
-            viewtype,
-            filename,
-            bytefile,
-            sender,
-            quote,
-            chat,
-        ) in self._replies:
-            msg = self._create_message(
-                text, html, viewtype, filename, bytefile, sender, quote
-            )
-            if chat is None:
-                chat = self.incoming_message.chat
+        if self.outbound is not None and self.outbound.coalesce_limit:
+            self._coalesce(self.outbound.coalesce_limit, self.outbound.coalesce_exclude)
+        while self._replies:
+            reply = self._replies.pop(0)
+            if self.outbound is not None and self.outbound.submit(self, reply):
+                continue
+            yield self._send_reply(reply)
+
+    def _coalesce(self, limit: int, exclude: Collection[str] = ()) -> None:
+        """Merge the consecutive plain text replies to the same chat, without
+        exceeding `limit` characters per message. The replies of the plugins
+        in `exclude` are never merged.
+        """
+        merged: List[tuple] = []
+        for reply in self._replies:
+            if (
+                merged
+                and _is_plain_text(reply, exclude)
+                and _is_plain_text(merged[-1], exclude)
+            ):
+                last = merged[-1]
+                text = last[0] + "\n\n" + reply[0]
+                if last[7] == reply[7] and len(text) <= limit:
+                    merged[-1] = (text,) + last[1:]
+                    continue
+            merged.append(reply)
+        self._replies = merged
+
+    def _send_reply(self, reply: tuple) -> Message:
+        text, html, viewtype, filename, bytefile, sender, quote, chat, _, plugin = reply
+        msg = self._create_message(
+            text, html, viewtype, filename, bytefile, sender, quote
+        )
+        if chat is None:
+            chat = self.incoming_message.chat
+        try:
+            limiter = self.outbound.limiter if self.outbound is not None else None
+            if limiter is not None:
+                limiter.acquire(chat, self.incoming_message)
             msg = chat.send_msg(msg)
-            yield msg
+        finally:
+            cache = self._get_blob_cache()
+            if cache is not None and msg.filename:
+                cache.release(msg.filename)
+        latency = self.outbound.latency if self.outbound is not None else None
+        if latency is not None:
+            chat_type = "group" if chat.is_multiuser() else "1:1"
+            latency.sent(self.incoming_message.id, msg.id, plugin, chat_type)
+        return msg
 
-        self._replies[:] = []
+    def _get_blob_cache(self) -> Optional[BlobCache]:
+        return self.outbound.blob_cache if self.outbound is not None else None
 
     def _create_message(
         self,
@@ -113,24 +262,42 @@ class Replies:
         sender: str = None,
         quote: Message = None,
     ) -> Message:
+        cache = self._get_blob_cache()
+        # the blob cache references the file, or the file is a temporary copy
+        cached = temporary = False
         if bytefile:
             assert filename is not None, "bytefile given but filename not provided"
             blobdir = self.incoming_message.account.get_blobdir()
-            parts = filename.split(".", maxsplit=1)
-            if len(parts) == 2:
-                prefix, suffix = parts
-                prefix += "-"
-                suffix = "." + suffix
+            if cache is not None:
+                with bytefile:
+                    filename = cache.add(bytefile, filename, blobdir)
+                cached = True
             else:
-                prefix = filename + "-"
-                suffix = None
-            with NamedTemporaryFile(
-                dir=blobdir, prefix=prefix, suffix=suffix, delete=False
-            ) as fp:
-                filename = fp.name
-            with open(filename, "wb") as f:
+                prefix, suffix = split_filename(filename)
+                with NamedTemporaryFile(
+                    dir=blobdir, prefix=prefix, suffix=suffix, delete=False
+                ) as fp:
+                    filename = fp.name
                 with bytefile:
-                    f.write(bytefile.read())
+                    copy_fileobj(bytefile, filename)
+                temporary = True
+        elif filename and cache is not None:
+            blobdir = self.incoming_message.account.get_blobdir()
+            if os.path.dirname(os.path.abspath(filename)) != os.path.abspath(blobdir):
+                with open(filename, "rb") as f:
+                    filename = cache.add(f, os.path.basename(filename), blobdir)
+                cached = True
+
+        media = self.outbound.media if self.outbound is not None else None
+        if media is not None and filename and viewtype == "image":
+            blobdir = self.incoming_message.account.get_blobdir()
+            shrunk = media.process(filename, blobdir)
+            if shrunk != filename:
+                if cached:
+                    cache.release(filename)
+                elif temporary:
+                    os.remove(filename)
+                filename = shrunk
 
         if not viewtype:
             if filename:
@@ -153,6 +320,17 @@ class Replies:
         return msg
 
 
+def _is_plain_text(reply: tuple, exclude: Collection[str] = ()) -> bool:
+    text, html, viewtype, filename, bytefile, sender, quote, _, coalesce, plugin = reply
+    return bool(
+        coalesce
+        and plugin not in exclude
+        and text
+        and viewtype in (None, "text")
+        and not (html or filename or bytefile or sender or quote)
+    )
+
+
 class DeltaBot:
     def __init__(
         self, account: Account, logger, plugin_manager=None, args: tuple = ()
@@ -168,9 +346,21 @@ class DeltaBot:
 
         self.logger = logger
 
+        #: default timeout in seconds for command and filter handlers,
+        #: None or 0 means handlers can run forever
+        self.handler_timeout = getattr(args, "handler_timeout", None)
+
+        # rendered /help messages per (is_admin, has_prefs) variant
+        self._help_cache: dict = {}
+        self._help_version: tuple = ()
+        self._has_prefs: Optional[bool] = None
+
         #: plugin subsystem for adding/removing plugins and calling plugin hooks
         #: see :class:`simplebot.plugins.Plugins`
         self.plugins = Plugins(logger=logger, plugin_manager=plugin_manager)
+        self.plugins.fast_dispatch = bool(getattr(args, "fast_dispatch", False))
+        self.plugins.breaker_threshold = getattr(args, "circuit_breaker", None) or 0
+        self.plugins.breaker_slow = getattr(args, "slow_hook", None)
 
         #: commands subsystem for registering/executing commands in incoming messages
         #: see :class:`simplebot.commands.Commands`
@@ -180,6 +370,10 @@ class DeltaBot:
         #: see :class:`simplebot.filters.Filters`
         self.filters = Filters(self)
 
+        #: lazily computed per-message annotations shared by plugins
+        #: see :class:`simplebot.annotations.Annotations`
+        self.annotations = Annotations(self)
+
         # process dc events and turn them into simplebot ones
         self._eventhandler = IncomingEventHandler(self)
 
@@ -187,6 +381,71 @@ class DeltaBot:
             kwargs=dict(bot=self, args=args)
         )
 
+        #: rate limits for incoming commands and messages
+        #: see :class:`simplebot.ratelimit.RateLimiter`
+        self.ratelimiter = RateLimiter(self, getattr(args, "rate_limit", None))
+        self.plugins.add_module("ratelimiter", self.ratelimiter)
+
+        #: queue sending the replies out of the message processing thread
+        #: see :class:`simplebot.outbound.OutboundQueue`
+        self.outbound = OutboundQueue(
+            self,
+            workers=getattr(args, "send_workers", None) or 0,
+            max_depth=getattr(args, "send_queue", None),
+        )
+        self.plugins.add_module("outbound", self.outbound)
+
+        #: sends messages to many chats in the background
+        #: see :class:`simplebot.broadcast.Broadcaster`
+        self.broadcaster = Broadcaster(self)
+        self.plugins.add_module("broadcaster", self.broadcaster)
+
+        #: persistent outbox of messages to send later
+        #: see :class:`simplebot.scheduler.Scheduler`
+        self.scheduler = Scheduler(self)
+        self.plugins.add_module("scheduler", self.scheduler)
+        self.outbound.scheduler = self.scheduler
+        blob_cache = getattr(args, "blob_cache", None)
+        if blob_cache:
+            self.outbound.blob_cache = BlobCache(int(blob_cache * 2**20))
+        self.outbound.coalesce_limit = getattr(args, "coalesce_replies", None) or 0
+        no_coalesce = getattr(args, "no_coalesce_plugins", None) or ""
+        self.outbound.coalesce_exclude = frozenset(
+            name.strip() for name in no_coalesce.split(",") if name.strip()
+        )
+        send_rate = getattr(args, "send_rate", None)
+        chat_send_rate = getattr(args, "chat_send_rate", None)
+        if send_rate or chat_send_rate:
+            self.outbound.limiter = SendLimiter(self, send_rate, chat_send_rate)
+            if getattr(args, "send_workers", None) is None:
+                # don't block the message processing waiting for tokens
+                self.outbound.workers = 1
+        latency_samples = getattr(args, "latency_samples", None)
+        if latency_samples:
+            self.outbound.latency = LatencyTracker(latency_samples)
+        image_max_side = getattr(args, "image_max_side", None)
+        image_max_size = getattr(args, "image_max_size", None)
+        if image_max_side or image_max_size:
+            self.outbound.media = ImageShrinker(
+                logger,
+                max_side=image_max_side,
+                max_bytes=int(image_max_size * 1024) if image_max_size else None,
+                quality=getattr(args, "image_quality", None) or 85,
+            )
+            if getattr(args, "send_workers", None) is None:
+                # don't block the message processing decoding the images
+                self.outbound.workers = 1
+
+        # chat id -> names of the plugins disabled in that chat
+        self._disabled_plugins: Dict[int, frozenset] = {}
+        for chat_id, value in self.list_settings(scope="disabled-plugins"):
+            self._disabled_plugins[int(chat_id)] = frozenset(value.split("\n"))
+
+        # chat id -> gate mode of the chats where incoming messages are gated
+        self._chat_gates: Dict[int, str] = {}
+        for chat_id, mode in self.list_settings(scope="chat-gates"):
+            self._chat_gates[int(chat_id)] = mode
+
         # register /help command
         self.commands.register(func=self._help, name="/help")
 
@@ -214,6 +473,9 @@ class DeltaBot:
         for items in _filters:
             self.filters.register(**dict(items))
 
+        for items in _annotations:
+            self.annotations.register(**dict(items))
+
     #
     # API for bot administration
     #
@@ -296,6 +558,7 @@ class DeltaBot:
         """
         assert description is not None
         self.set(name, description, scope="preferences")
+        self._has_prefs = None
 
     def get_preference_description(self, name: str) -> Optional[str]:
         """Return preference description or None if the preference doesn't exist."""
@@ -304,11 +567,118 @@ class DeltaBot:
     def delete_preference(self, name: str) -> None:
         """delete a preference, it will no longer be available to users."""
         self.delete(name, scope="preferences")
+        self._has_prefs = None
 
     def get_preferences(self) -> List[tuple]:
         """get list of preferences available to users."""
         return self.list_settings(scope="preferences")
 
+    #
+    # API for per-chat plugin enablement and message gating
+    #
+    def get_disabled_plugins(self, ref: Union[Message, Chat, int]) -> frozenset:
+        """Return the names of the plugins disabled in the given chat.
+
+        ref can be a Message, Chat or chat-id integer.
+        """
+        if not self._disabled_plugins:
+            return frozenset()
+        if isinstance(ref, int):
+            chat_id = ref
+        elif isinstance(ref, Chat):
+            chat_id = ref.id
+        else:
+            chat_id = ref.chat.id
+        return self._disabled_plugins.get(chat_id, frozenset())
+
+    def set_plugin_enabled(self, chat: Union[Chat, int], plugin: str, enabled: bool):
+        """Enable or disable the commands and filters of a plugin in the given chat.
+
+        plugin is the name of the python module the commands and filters
+        are defined in, the bot's builtin plugins can't be disabled.
+        """
+        if plugin.startswith("simplebot."):
+            raise ValueError(f"builtin plugin {plugin!r} can't be disabled")
+        chat_id = chat if isinstance(chat, int) else chat.id
+        disabled = set(self.get_disabled_plugins(chat_id))
+        if enabled:
+            disabled.discard(plugin)
+        else:
+            disabled.add(plugin)
+        if disabled:
+            self.set(
+                str(chat_id), "\n".join(sorted(disabled)), scope="disabled-plugins"
+            )
+            self._disabled_plugins[chat_id] = frozenset(disabled)
+        else:
+            self.delete(str(chat_id), scope="disabled-plugins")
+            self._disabled_plugins.pop(chat_id, None)
+
+    def get_chat_gate(self, chat: Union[Chat, int]) -> Optional[str]:
+        """Return the gate mode of the given chat, None if it is not gated."""
+        return self._chat_gates.get(chat if isinstance(chat, int) else chat.id)
+
+    def set_chat_gate(self, chat: Union[Chat, int], mode: Optional[str]) -> None:
+        """Gate the incoming messages of the given chat before they are queued.
+
+        mode is one of:
+        - "commands": only commands are processed, filters don't see the chat.
+        - "muted": only commands of bot administrators are processed.
+        - None: all messages are processed.
+        """
+        if mode is not None and mode not in CHAT_GATES:
+            raise ValueError(f"gate mode must be one of {CHAT_GATES!r}")
+        chat_id = chat if isinstance(chat, int) else chat.id
+        if mode is None:
+            self.delete(str(chat_id), scope="chat-gates")
+            self._chat_gates.pop(chat_id, None)
+        else:
+            self.set(str(chat_id), mode, scope="chat-gates")
+            self._chat_gates[chat_id] = mode
+
+    def gate_allows(self, message: Message) -> bool:
+        """False if the message must be discarded according to its chat's gate."""
+        if not self._chat_gates:
+            return True
+        mode = self._chat_gates.get(message.chat.id)
+        if mode is None:
+            return True
+        # system messages can't trigger commands or filters but other hooks
+        if message.is_system_message():
+            return True
+        if not message.text.startswith(CMD_PREFIX):
+            return False
+        if mode == "muted":
+            return self.is_admin(message.get_sender_contact().addr)
+        return True
+
+    #
+    # API for sending messages
+    #
+    def broadcast(self, chats: list, text: str = None, **kwargs) -> int:
+        """Send a message to the given chats or chat ids in the background.
+
+        Accepts the same message arguments as :meth:`Replies.add`, returns the
+        id of the broadcast job, its progress is saved so it is resumed if the
+        bot is restarted, see :class:`simplebot.broadcast.Broadcaster`.
+        """
+        return self.broadcaster.broadcast(chats, text, **kwargs)
+
+    def schedule_message(
+        self,
+        chat: Union[Chat, int],
+        send_at: Union[datetime, float],
+        text: str = None,
+        **kwargs,
+    ) -> int:
+        """Save a message in the persistent outbox to send it at the given time.
+
+        Accepts the same message arguments as :meth:`Replies.add`, returns the
+        id of the scheduled message, that can be used to cancel it with
+        `bot.scheduler.cancel(id)`.
+        """
+        return self.scheduler.schedule(chat, send_at, text, **kwargs)
+
     #
     # API for getting at and creating contacts and chats
     #
@@ -415,9 +785,20 @@ class DeltaBot:
     def _help(self, bot, command, replies) -> None:
         """get the bot's help."""
         is_admin = bot.is_admin(command.message.get_sender_contact().addr)
+        if self._has_prefs is None:
+            self._has_prefs = bool(bot.get_preferences())
+        version = (self.commands.version, self.filters.version, self.plugins.version)
+        if version != self._help_version:
+            self._help_cache.clear()
+            self._help_version = version
+        key = (is_admin, self._has_prefs)
+        html = self._help_cache.get(key)
+        if html is None:
+            html = self._help_cache[key] = self._render_help(*key)
+        replies.add(text="ℹ️ Help", html=html)
 
+    def _render_help(self, is_admin: bool, has_prefs: bool) -> str:
         cmds = []
-        has_prefs = bool(bot.get_preferences())
         for c in self.commands._cmd_defs.values():
             if not c.hidden and (not c.admin or is_admin):
                 if c.cmd != "/set" or has_prefs:
@@ -431,14 +812,13 @@ class DeltaBot:
         filters.sort(key=lambda f: f.name)
 
         plugins = []
-        for plug, _ in bot.plugins._pm.list_plugin_distinfo():
-            plugins.append(bot.plugins._pm.get_name(plug))
+        for plug, _ in self.plugins._pm.list_plugin_distinfo():
+            plugins.append(self.plugins._pm.get_name(plug))
         plugins.sort()
 
-        html = help_template.render(
-            addr=bot.self_contact.addr, cmds=cmds, filters=filters, plugins=plugins
+        return help_template.render(
+            addr=self.self_contact.addr, cmds=cmds, filters=filters, plugins=plugins
         )
-        replies.add(text="ℹ️ Help", html=html)
 
 
 class CheckAll:
@@ -477,9 +857,10 @@ class CheckAll:
             update["serial"],
             update["data"],
         )
-        replies = Replies(message, logger=logger)
-        self.bot.plugins.hook.deltabot_incoming_message(
-            message=message, bot=self.bot, replies=replies
+        replies = Replies(message, logger=logger, outbound=self.bot.outbound)
+        self.bot.annotations.of(message)
+        self.bot.plugins.call(
+            "deltabot_incoming_message", message=message, bot=self.bot, replies=replies
         )
         replies.send_reply_messages()
 
@@ -495,19 +876,28 @@ class CheckAll:
         sender = message.get_sender_contact()
         if sender != self.bot.self_contact:
             message.mark_seen()
-        replies = Replies(message, logger=logger)
+        replies = Replies(message, logger=logger, outbound=self.bot.outbound)
+        self.bot.annotations.of(message)
         logger.info("processing incoming fresh message id=%s", message.id)
         if message.is_system_message():
             self.handle_system_message(message, replies)
         elif not message.get_sender_contact().is_blocked():
             if message.is_bot():
-                self.bot.plugins.hook.deltabot_incoming_bot_message(
-                    message=message, bot=self.bot, replies=replies
+                self.bot.plugins.call(
+                    "deltabot_incoming_bot_message",
+                    message=message,
+                    bot=self.bot,
+                    replies=replies,
                 )
             else:
-                self.bot.plugins.hook.deltabot_incoming_message(
-                    message=message, bot=self.bot, replies=replies
+                self.bot.plugins.call(
+                    "deltabot_incoming_message",
+                    message=message,
+                    bot=self.bot,
+                    replies=replies,
                 )
+        if self.bot.outbound.latency is not None:
+            self.bot.outbound.latency.processed(message.id)
         replies.send_reply_messages()
         logger.info("processing message=%s FINISHED", msg_id)
 
@@ -600,6 +990,11 @@ class IncomingEventHandler:
         self.logger.debug(
             f"incoming message from {message.get_sender_contact().addr} id={message.id} chat={message.chat.id} text={message.text[:50]!r}"
         )
+        if not self.bot.gate_allows(message):
+            self.logger.debug(f"message id={message.id} discarded by chat gate")
+            return
+        if self.bot.outbound.latency is not None:
+            self.bot.outbound.latency.arrived(message.id)
 
         self.db.put_msg(message.id)
         # message is now in DB, schedule a check
@@ -625,6 +1020,8 @@ class IncomingEventHandler:
         self.logger.debug(
             "message id=%s chat=%s delivered to smtp", message.id, message.chat.id
         )
+        if self.bot.outbound.latency is not None:
+            self.bot.outbound.latency.delivered(message.id)
 
     @account_hookimpl
     def ac_process_ffi_event(self, ffi_event: FFIEvent) -> None:
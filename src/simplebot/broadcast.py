@@ -0,0 +1,229 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import NamedTemporaryFile
+from typing import Iterable, Optional, Union
+
+from deltachat import Chat, Message
+
+from .blobcache import split_filename
+from .hookspec import deltabot_hookimpl
+from .utils import copy_fileobj
+
+
+class Broadcaster:
+    """Sends a message to many chats from a background thread.
+
+    Jobs and their progress are persisted in the bot's database after every
+    batch of chats, so they are resumed after a restart, and after a crash
+    only the chats of the unfinished batch can get the message twice.
+    """
+
+    def __init__(self, bot, workers: int = 4, batch_size: int = 50) -> None:
+        self.bot = bot
+        self.logger = bot.logger
+        #: number of messages sent concurrently
+        self.workers = workers
+        #: number of chats sent between progress checkpoints
+        self.batch_size = batch_size
+        self._cancelled: set = set()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        self._lock = threading.Lock()
+
+    def _get_db(self):
+        return self.bot.plugins._pm.get_plugin(name="db")
+
+    def broadcast(
+        self,
+        chats: Iterable[Union[Chat, int]],
+        text: str = None,
+        *,
+        html: str = None,
+        viewtype: str = None,
+        filename: str = None,
+        bytefile=None,
+        sender: str = None,
+    ) -> int:
+        """Schedule a message to be sent to the given chats, return the job id.
+
+        The arguments are the same as :meth:`simplebot.bot.Replies.add`,
+        the attachment is copied to the blobdir once and shared by all the
+        messages.
+        """
+        spec = make_spec(
+            self.bot.account, text, html, viewtype, filename, bytefile, sender
+        )
+        chat_ids = [chat if isinstance(chat, int) else chat.id for chat in chats]
+        job_id = self._get_db().add_broadcast(
+            json.dumps(spec), json.dumps(chat_ids), time.time()
+        )
+        self.logger.info(f"broadcast {job_id} scheduled to {len(chat_ids)} chats")
+        self._wakeup.set()
+        return job_id
+
+    def cancel(self, job_id: int) -> bool:
+        """Stop sending the given job, return False if it is not pending."""
+        for row in self._get_db().get_broadcasts(pending=True):
+            if row["id"] == job_id:
+                self._cancelled.add(job_id)
+                self._get_db().update_broadcast(
+                    job_id, row["cursor"], row["sent"], row["failed"], time.time()
+                )
+                return True
+        return False
+
+    def get_report(self) -> str:
+        lines = []
+        for row in self._get_db().get_broadcasts():
+            total = len(json.loads(row["chats"]))
+            if row["finished"] is None:
+                state = "pending"
+            elif row["cursor"] < total:
+                state = "cancelled"
+            else:
+                state = "done"
+            lines.append(
+                f"#{row['id']} {state}: {row['cursor']}/{total}"
+                f" sent={row['sent']} failed={row['failed']}"
+            )
+        return "\n".join(lines) or "No broadcasts"
+
+    def run_pending(self) -> None:
+        """Send the pending jobs, blocking until they are done."""
+        with self._lock:
+            for row in self._get_db().get_broadcasts(pending=True):
+                self._run_job(row)
+            # forget the cancelled jobs, they are finished in the database
+            pending = {row["id"] for row in self._get_db().get_broadcasts(pending=True)}
+            self._cancelled.intersection_update(pending)
+
+    def _run_job(self, row) -> None:
+        job_id = row["id"]
+        spec = json.loads(row["spec"])
+        chat_ids = json.loads(row["chats"])
+        cursor, sent, failed = row["cursor"], row["sent"], row["failed"]
+        self.logger.info(f"broadcast {job_id} running from {cursor}/{len(chat_ids)}")
+        with ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="broadcast"
+        ) as pool:
+            while cursor < len(chat_ids):
+                if self._thread is not None and not self._running:
+                    return
+                if job_id in self._cancelled:
+                    # the row can be stale, the job was cancelled after it was read
+                    self._get_db().update_broadcast(
+                        job_id, cursor, sent, failed, time.time()
+                    )
+                    self._cancelled.discard(job_id)
+                    self.logger.info(f"broadcast {job_id} cancelled")
+                    return
+                batch = chat_ids[cursor : cursor + self.batch_size]
+                for ok in pool.map(lambda chat_id: self._send(spec, chat_id), batch):
+                    if ok:
+                        sent += 1
+                    else:
+                        failed += 1
+                cursor += len(batch)
+                finished = time.time() if cursor >= len(chat_ids) else None
+                self._get_db().update_broadcast(job_id, cursor, sent, failed, finished)
+        self._cancelled.discard(job_id)
+        self.logger.info(f"broadcast {job_id} finished: sent={sent} failed={failed}")
+
+    def _send(self, spec: dict, chat_id: int) -> bool:
+        try:
+            send_spec(self.bot, spec, chat_id, priority=False)
+        except Exception as ex:
+            self.logger.warning(f"broadcast to chat {chat_id} failed: {ex}")
+            return False
+        return True
+
+    def _worker(self) -> None:
+        while self._running:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            try:
+                self.run_pending()
+            except Exception as ex:
+                self.logger.exception(ex)
+
+    @deltabot_hookimpl
+    def deltabot_start(self, bot) -> None:  # noqa
+        self._running = True
+        self._wakeup.set()
+        self._thread = threading.Thread(
+            target=self._worker, name="broadcast", daemon=True
+        )
+        self._thread.start()
+
+    @deltabot_hookimpl
+    def deltabot_shutdown(self, bot) -> None:  # noqa
+        self._running = False
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+
+
+def make_spec(
+    account,
+    text: str = None,
+    html: str = None,
+    viewtype: str = None,
+    filename: str = None,
+    bytefile=None,
+    sender: str = None,
+    quote: Message = None,
+) -> dict:
+    """Return a JSON-serializable description of a message to send later.
+
+    The attachment is copied to the blobdir if it is not already there.
+    """
+    blobdir = os.path.abspath(account.get_blobdir())
+    if bytefile or (filename and os.path.dirname(os.path.abspath(filename)) != blobdir):
+        if bytefile:
+            if not filename or os.path.basename(filename) != filename:
+                raise ValueError("bytefile needs a file name without path")
+            src = bytefile
+        else:
+            src = open(filename, "rb")  # noqa
+        prefix, suffix = split_filename(os.path.basename(filename))
+        with NamedTemporaryFile(
+            dir=blobdir, prefix=prefix, suffix=suffix, delete=False
+        ) as fp:
+            filename = fp.name
+        with src:
+            copy_fileobj(src, filename)
+    return dict(
+        text=text,
+        html=html,
+        viewtype=viewtype,
+        filename=filename,
+        sender=sender,
+        quote=quote.id if quote is not None else None,
+    )
+
+
+def send_spec(bot, spec: dict, chat_id: int, priority: bool = None) -> Message:
+    """Send the message described by the given spec to the chat."""
+    account = bot.account
+    chat = account.get_chat_by_id(chat_id)
+    viewtype = spec["viewtype"] or ("file" if spec["filename"] else "text")
+    msg = Message.new_empty(account, viewtype)
+    if spec.get("quote"):
+        msg.quote = account.get_message_by_id(spec["quote"])
+    if spec["text"]:
+        msg.set_text(spec["text"])
+    if spec["html"]:
+        msg.set_html(spec["html"])
+    if spec["filename"]:
+        msg.set_file(spec["filename"])
+    if spec["sender"]:
+        msg.set_override_sender_name(spec["sender"])
+    limiter = bot.outbound.limiter
+    if limiter is not None:
+        limiter.acquire(chat, priority=bool(priority))
+    return chat.send_msg(msg)
@@ -108,6 +108,87 @@ def cmd_unban(command, replies) -> None:
     replies.add(text=f"Unbanned: {command.payload}")
 
 
+@command_decorator(name="/filters", admin=True)
+def cmd_filters(bot, replies) -> None:
+    """Show the filters in calling order with their runtime statistics."""
+    replies.add(text=bot.filters.get_report())
+
+
+@command_decorator(name="/gate", admin=True)
+def cmd_gate(bot, payload, message, replies) -> None:
+    """Set which incoming messages of the current chat are processed, or show it if no arguments are given.
+
+    "commands" processes only commands, "muted" only administrators' commands
+    and "off" all messages.
+
+    Examples:
+    /gate commands
+    /gate off
+    """
+    if payload:
+        try:
+            bot.set_chat_gate(message.chat, None if payload == "off" else payload)
+        except ValueError as ex:
+            replies.add(text=f"❌ {ex}")
+            return
+    replies.add(text=f"Gate: {bot.get_chat_gate(message.chat) or 'off'}")
+
+
+@command_decorator(name="/outbound", admin=True)
+def cmd_outbound(bot, replies) -> None:
+    """Show the state of the outbound queue."""
+    replies.add(text=bot.outbound.get_report())
+
+
+@command_decorator(name="/broadcast", admin=True)
+def cmd_broadcast(bot, args, replies) -> None:
+    """Show the progress of the broadcasts, or cancel one.
+
+    Examples:
+    /broadcast
+    /broadcast cancel 3
+    """
+    if len(args) == 2 and args[0] == "cancel" and args[1].isdigit():
+        if not bot.broadcaster.cancel(int(args[1])):
+            replies.add(text=f"❌ broadcast #{args[1]} is not pending")
+            return
+    replies.add(text=bot.broadcaster.get_report())
+
+
+@command_decorator(name="/breakers", admin=True)
+def cmd_breakers(bot, replies) -> None:
+    """Show the state of the plugins' circuit breakers."""
+    replies.add(text=bot.plugins.get_breakers_report())
+
+
+@command_decorator(name="/plugins", admin=True)
+def cmd_plugins(bot, args, message, replies) -> None:
+    """Enable or disable plugins in the current chat, or list them if no arguments are given.
+
+    Examples:
+    /plugins
+    /plugins disable simplebot_echo
+    /plugins enable simplebot_echo
+    """
+    if len(args) == 2 and args[0] in ("enable", "disable"):
+        try:
+            bot.set_plugin_enabled(message.chat, args[1], args[0] == "enable")
+        except ValueError as ex:
+            replies.add(text=f"❌ {ex}")
+            return
+    plugins = set()
+    for cmd_def in bot.commands.dict().values():
+        plugins.add(cmd_def.plugin)
+    for filter_def in bot.filters.dict().values():
+        plugins.add(filter_def.plugin)
+    disabled = bot.get_disabled_plugins(message.chat)
+    lines = []
+    for name in sorted(plugins):
+        if not name.startswith("simplebot."):
+            lines.append(f"{'❌' if name in disabled else '✔️'} {name}")
+    replies.add(text="Plugins in this chat:\n" + ("\n".join(lines) or "(Empty list)"))
+
+
 def ban_addr(bot, addr: str) -> None:
     contact = bot.get_contact(addr)
     contact.block()
@@ -4,7 +4,9 @@ import sys
 
 from deltachat.tracker import ImexFailed
 
+from ..blobcache import delete_blobs, find_garbage_blobs, get_referenced_blobs
 from ..hookspec import deltabot_hookimpl
+from ..ratelimit import parse_rate
 from ..utils import (
     abspath,
     get_account_path,
@@ -24,6 +26,7 @@ def deltabot_init_parser(parser) -> None:
     parser.add_subcommand(Info)
     parser.add_subcommand(Serve)
     parser.add_subcommand(PluginCmd)
+    parser.add_subcommand(BlobsCmd)
     parser.add_subcommand(set_avatar)
     parser.add_subcommand(set_name)
     parser.add_subcommand(set_status)
@@ -65,6 +68,143 @@ def deltabot_init_parser(parser) -> None:
     parser.add_generic_option(
         "--show-ffi", action="store_true", help="show low level ffi events."
     )
+    parser.add_generic_option(
+        "--handler-timeout",
+        type=float,
+        metavar="SECONDS",
+        help="default timeout for command and filter handlers, 0 to disable.",
+        inipath="bot:handler_timeout",
+    )
+    parser.add_generic_option(
+        "--rate-limit",
+        metavar="CALLS/SECONDS",
+        help="maximum number of messages a sender can send to the bot in the given"
+        " amount of seconds, for example 10/60, by default there is no limit.",
+        inipath="bot:rate_limit",
+    )
+    parser.add_generic_option(
+        "--adaptive-filters",
+        type=int,
+        metavar="MESSAGES",
+        help="reorder filters with the same priority by their cost and claim rate"
+        " every this number of messages, 0 (default) keeps registration order.",
+        inipath="bot:adaptive_filters",
+    )
+    parser.add_generic_option(
+        "--fast-dispatch",
+        action="store_true",
+        help="call the incoming message hooks directly from a precompiled list"
+        " instead of through pluggy.",
+        inipath="bot:fast_dispatch",
+    )
+    parser.add_generic_option(
+        "--circuit-breaker",
+        type=int,
+        metavar="FAILURES",
+        help="skip for a while the plugins' message hooks that fail or are slow"
+        " this number of consecutive times, 0 (default) disables it.",
+        inipath="bot:circuit_breaker",
+    )
+    parser.add_generic_option(
+        "--slow-hook",
+        type=float,
+        metavar="SECONDS",
+        help="consider as failed the message hooks taking longer than this.",
+        inipath="bot:slow_hook",
+    )
+    parser.add_generic_option(
+        "--send-workers",
+        type=int,
+        metavar="THREADS",
+        help="send the replies from this number of threads out of the message"
+        " processing thread, 0 sends them synchronously, the default is 0, or 1"
+        " if a send rate or an image limit is set.",
+        inipath="bot:send_workers",
+    )
+    parser.add_generic_option(
+        "--send-queue",
+        type=int,
+        metavar="REPLIES",
+        help="maximum number of replies queued per send worker before message"
+        " processing blocks (default: 1000).",
+        inipath="bot:send_queue",
+    )
+    parser.add_generic_option(
+        "--blob-cache",
+        type=float,
+        metavar="MEGABYTES",
+        help="reuse the blobs of attachments sent before with the same content and"
+        " file name, keeping up to this size of unused blobs, by default every"
+        " attachment is written again.",
+        inipath="bot:blob_cache",
+    )
+    parser.add_generic_option(
+        "--coalesce-replies",
+        type=int,
+        metavar="CHARS",
+        help="merge consecutive plain text replies to the same chat into messages"
+        " of up to this number of characters, 0 (default) disables it.",
+        inipath="bot:coalesce_replies",
+    )
+    parser.add_generic_option(
+        "--no-coalesce-plugins",
+        metavar="PLUGINS",
+        help="comma separated list of plugins (module names) whose replies are"
+        " never merged by --coalesce-replies.",
+        inipath="bot:no_coalesce_plugins",
+    )
+    parser.add_generic_option(
+        "--send-rate",
+        metavar="CALLS/SECONDS",
+        help="maximum number of messages the bot can send in the given amount of"
+        " seconds, for example 60/60, replies to 1:1 chats and administrators"
+        " have priority, except with --send-workers 0 where all the replies"
+        " are sent in order, by default there is no limit.",
+        inipath="bot:send_rate",
+    )
+    parser.add_generic_option(
+        "--chat-send-rate",
+        metavar="CALLS/SECONDS",
+        help="maximum number of messages the bot can send to a chat in the given"
+        " amount of seconds, by default there is no limit.",
+        inipath="bot:chat_send_rate",
+    )
+    parser.add_generic_option(
+        "--latency-samples",
+        type=int,
+        metavar="N",
+        help="track the time the replies take from the arrival of the incoming"
+        " message to their delivery, keeping the last N delivered replies, the"
+        " /outbound command shows the percentiles, 0 (default) disables it.",
+        inipath="bot:latency_samples",
+    )
+    parser.add_generic_option(
+        "--image-max-side",
+        type=int,
+        metavar="PIXELS",
+        help="downscale the images sent by the bot with the image view type so"
+        " their longest side is at most this number of pixels, by default images"
+        " are sent unchanged. The replies are sent from one worker thread unless"
+        " --send-workers is given.",
+        inipath="bot:image_max_side",
+    )
+    parser.add_generic_option(
+        "--image-max-size",
+        type=float,
+        metavar="KB",
+        help="recompress the images sent by the bot that are bigger than this"
+        " size in kilobytes, by default images are sent unchanged. The replies"
+        " are sent from one worker thread unless --send-workers is given.",
+        inipath="bot:image_max_size",
+    )
+    parser.add_generic_option(
+        "--image-quality",
+        type=int,
+        metavar="QUALITY",
+        help="JPEG and WebP quality (1-95) of the downscaled or recompressed"
+        " images, 85 by default.",
+        inipath="bot:image_quality",
+    )
 
 
 @deltabot_hookimpl
@@ -301,6 +441,63 @@ class PluginCmd:
         out.line(f"removed {len(existing) - len(remaining)} module(s)")
 
 
+class BlobsCmd:
+    """show the space used by the blobdir and delete the blobs not used anymore."""
+
+    name = "blobs"
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument(
+            "--gc",
+            help="delete the blobs not referenced by any message.",
+            action="store_true",
+        )
+        parser.add_argument(
+            "--dry-run",
+            help="only report what would be deleted.",
+            action="store_true",
+        )
+        parser.add_argument(
+            "--min-age",
+            help="only delete blobs not modified in this number of seconds,"
+            " protecting the ones of messages being prepared (default: 3600).",
+            type=float,
+            default=3600,
+            metavar="SECONDS",
+        )
+        parser.add_argument(
+            "--batch",
+            help="number of blobs deleted per batch (default: 100).",
+            type=int,
+            default=100,
+        )
+        parser.add_argument(
+            "--rate",
+            help="maximum number of blobs deleted in the given amount of seconds,"
+            " for example 1000/1, by default there is no limit.",
+            type=parse_rate,
+            metavar="FILES/SECONDS",
+        )
+
+    def run(self, bot, args, out) -> None:
+        blobdir = bot.account.get_blobdir()
+        referenced = get_referenced_blobs(bot.account.db_path)
+        # attachments of messages that will be sent later
+        referenced |= bot.plugins._pm.get_plugin(name="db").get_pending_blobs()
+        garbage = find_garbage_blobs(blobdir, referenced, args.min_age)
+        if args.gc and not args.dry_run:
+            count, size = delete_blobs(garbage, args.batch, args.rate)
+            out.line(f"deleted {count} blob(s), {size / 2**20:.2f}MB reclaimed")
+            return
+        total = sum(entry.stat().st_size for entry in os.scandir(blobdir))
+        count = size = 0
+        for _, blob_size in garbage:
+            count += 1
+            size += blob_size
+        out.line(f"blobdir: {blobdir} ({total / 2**20:.2f}MB)")
+        out.line(f"{count} unreferenced blob(s), {size / 2**20:.2f}MB reclaimable")
+
+
 class set_avatar:
     """set account's avatar."""
 
@@ -1,5 +1,7 @@
+import json
 import os
 import sqlite3
+from typing import Optional
 
 from ..hookspec import deltabot_hookimpl
 
@@ -28,6 +30,25 @@ class DBManager:
                 "DROP TABLE IF EXISTS msgs"  # migration from version <= 2.4.0
             )
             self.db.execute("CREATE TABLE IF NOT EXISTS msgs (msg TEXT PRIMARY KEY)")
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS ratelimits"
+                " (key TEXT PRIMARY KEY, calls INTEGER, seconds REAL,"
+                " tokens REAL, stamp REAL)"
+            )
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS broadcasts"
+                " (id INTEGER PRIMARY KEY AUTOINCREMENT, spec TEXT, chats TEXT,"
+                " cursor INTEGER DEFAULT 0, sent INTEGER DEFAULT 0,"
+                " failed INTEGER DEFAULT 0, created REAL, finished REAL)"
+            )
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS outbox"
+                " (id INTEGER PRIMARY KEY AUTOINCREMENT, send_at REAL,"
+                " chat_id INTEGER, spec TEXT, attempts INTEGER DEFAULT 0)"
+            )
+            self.db.execute(
+                "CREATE INDEX IF NOT EXISTS outbox_send_at ON outbox (send_at)"
+            )
 
     def put_msg(self, msg: str) -> None:
         with self.db:
@@ -40,6 +61,94 @@ class DBManager:
     def get_msgs(self) -> list:
         return [r[0] for r in self.db.execute("SELECT * FROM msgs").fetchall()]
 
+    def get_rate_limits(self) -> list:
+        return [
+            tuple(r)
+            for r in self.db.execute(
+                "SELECT key, calls, seconds, tokens, stamp FROM ratelimits"
+            ).fetchall()
+        ]
+
+    def set_rate_limits(self, updated: list, deleted: list) -> None:
+        with self.db:
+            self.db.executemany("REPLACE INTO ratelimits VALUES (?,?,?,?,?)", updated)
+            self.db.executemany(
+                "DELETE FROM ratelimits WHERE key=?", [(key,) for key in deleted]
+            )
+
+    def add_broadcast(self, spec: str, chats: str, created: float) -> int:
+        with self.db:
+            cur = self.db.execute(
+                "INSERT INTO broadcasts (spec, chats, created) VALUES (?,?,?)",
+                (spec, chats, created),
+            )
+        return cur.lastrowid
+
+    def get_broadcasts(self, pending: bool = False) -> list:
+        query = "SELECT * FROM broadcasts"
+        if pending:
+            query += " WHERE finished IS NULL"
+        return self.db.execute(query + " ORDER BY id").fetchall()
+
+    def update_broadcast(
+        self, job_id: int, cursor: int, sent: int, failed: int, finished: float = None
+    ) -> None:
+        with self.db:
+            self.db.execute(
+                "UPDATE broadcasts SET cursor=?, sent=?, failed=?, finished=?"
+                " WHERE id=?",
+                (cursor, sent, failed, finished, job_id),
+            )
+
+    def add_scheduled(self, send_at: float, chat_id: int, spec: str) -> int:
+        with self.db:
+            cur = self.db.execute(
+                "INSERT INTO outbox (send_at, chat_id, spec) VALUES (?,?,?)",
+                (send_at, chat_id, spec),
+            )
+        return cur.lastrowid
+
+    def get_due_scheduled(self, now: float, limit: int) -> list:
+        return self.db.execute(
+            "SELECT * FROM outbox WHERE send_at<=? ORDER BY send_at, id LIMIT ?",
+            (now, limit),
+        ).fetchall()
+
+    def get_next_scheduled(self) -> Optional[float]:
+        return self.db.execute("SELECT MIN(send_at) FROM outbox").fetchone()[0]
+
+    def count_scheduled(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+    def retry_scheduled(self, msg_id: int, send_at: float) -> None:
+        with self.db:
+            self.db.execute(
+                "UPDATE outbox SET send_at=?, attempts=attempts+1 WHERE id=?",
+                (send_at, msg_id),
+            )
+
+    def get_pending_blobs(self) -> set:
+        """Return the names of the blobdir files attached to the scheduled
+        messages and the unfinished broadcasts.
+        """
+        blobs = set()
+        for query in (
+            "SELECT spec FROM outbox",
+            "SELECT spec FROM broadcasts WHERE finished IS NULL",
+        ):
+            for (spec,) in self.db.execute(query):
+                filename = json.loads(spec).get("filename")
+                if filename:
+                    blobs.add(os.path.basename(filename))
+        return blobs
+
+    def delete_scheduled(self, ids: list) -> int:
+        with self.db:
+            cur = self.db.executemany(
+                "DELETE FROM outbox WHERE id=?", [(i,) for i in ids]
+            )
+        return cur.rowcount
+
     @deltabot_hookimpl
     def deltabot_store_setting(self, key: str, value: str) -> None:
         with self.db:
@@ -1,9 +1,12 @@
 import inspect
 import types
 from collections import OrderedDict
-from typing import Callable, Dict, Generator, Optional, Set
+from typing import Callable, Collection, Dict, Generator, Optional, Set
 
 from .hookspec import deltabot_hookimpl
+from .plugins import CircuitBreaker
+from .ratelimit import parse_rate
+from .utils import FuzzyIndex, HandlerTimeout, call_with_timeout
 
 CMD_PREFIX = "/"
 _cmds: Set[tuple] = set()
@@ -16,7 +19,12 @@ class NotFound(LookupError):
 class Commands:
     def __init__(self, bot) -> None:
         self.logger = bot.logger
+        self.default_timeout = bot.handler_timeout
+        #: incremented every time a command is registered or unregistered
+        self.version = 0
         self._cmd_defs: Dict[str, CommandDef] = OrderedDict()
+        # index of command names for "did you mean" suggestions
+        self._index = FuzzyIndex()
         bot.plugins.add_module("commands", self)
 
     def register(
@@ -26,13 +34,24 @@ class Commands:
         help: str = None,  # noqa
         admin: bool = False,
         hidden: bool = False,
+        timeout: float = None,
+        rate_limit=None,
     ) -> None:
         """register a command function that acts on each incoming non-system message.
 
         :param func: function can accept 'bot', 'command'(:class:`simplebot.commands.IncomingCommand`), 'message', 'payload' and 'replies'(:class:`simplebot.bot.Replies`) arguments.
+                     It can be a generator yielding replies (dicts with
+                     :meth:`simplebot.bot.Replies.add` arguments or texts) to
+                     send them as soon as they are ready.
         :param name: name of the command, example "/test", if not provided it is autogenerated from function name.
         :param help: command help, it will be extracted from the function docstring if not provided.
         :param admin: if True the command will be available for bot administrators only.
+        :param timeout: seconds the command is allowed to run before it is abandoned
+                        and the user gets a timeout notice, if not provided the
+                        bot's default handler timeout is used, 0 disables it.
+        :param rate_limit: maximum number of times a sender can use the command
+                           in the given amount of seconds, as a (calls, seconds)
+                           tuple or "CALLS/SECONDS" string.
         """
         name = name or CMD_PREFIX + func.__name__
         if help is None:
@@ -59,24 +78,56 @@ class Commands:
             args=args,
             admin=admin,
             hidden=hidden,
+            plugin=func.__module__,
+            timeout=timeout,
+            rate_limit=parse_rate(rate_limit),
         )
         self._cmd_defs[name.lower()] = cmd_def
+        self.version += 1
+        self._index.add(name.lower())
         self.logger.debug(f"registered new command {name!r}")
 
     def unregister(self, name: str) -> Callable:
         """unregister a command function by name."""
-        return self._cmd_defs.pop(name.lower())
+        cmd_def = self._cmd_defs.pop(name.lower())
+        self.version += 1
+        self._index.remove(name.lower())
+        return cmd_def
 
     def dict(self) -> dict:
         return self._cmd_defs.copy()
 
+    def suggest(
+        self,
+        name: str,
+        is_admin: Callable[[], bool],
+        disabled_plugins: Collection[str] = (),
+    ) -> Optional[str]:
+        """Return the name of the visible command closest to the given name, if any.
+
+        :param is_admin: callable returning True if admin commands can be suggested.
+        :param disabled_plugins: plugins whose commands must not be suggested.
+        """
+        name = name.lower()
+        max_dist = 1 if len(name) <= 4 else 2
+        for _, cand in self._index.search(name, max_dist):
+            cmd_def = self._cmd_defs.get(cand)
+            if cmd_def is None or cmd_def.hidden or cand == name:
+                continue
+            if cmd_def.plugin in disabled_plugins:
+                continue
+            if cmd_def.admin and not is_admin():
+                continue
+            return cmd_def.cmd
+        return None
+
     @deltabot_hookimpl
     def deltabot_incoming_message(self, bot, message, replies) -> Optional[bool]:
-        if not message.text.startswith(CMD_PREFIX):
+        tokens = bot.annotations.of(message)["command"]
+        if tokens is None:
             return None
-        args = message.text.split()
-        payload = message.text.split(maxsplit=1)[1] if len(args) > 1 else ""
-        orig_cmd_name = args.pop(0)
+        orig_cmd_name, args, payload = tokens
+        args = list(args)
 
         if "@" in orig_cmd_name:
             suffix = "@" + bot.self_contact.addr
@@ -94,32 +145,67 @@ class Commands:
             args.insert(0, newarg)
             payload = (newarg + " " + payload).rstrip()
 
-        if not cmd_def or (
-            cmd_def.admin and not bot.is_admin(message.get_sender_contact().addr)
+        disabled_plugins = bot.get_disabled_plugins(message)
+        if (
+            not cmd_def
+            or (cmd_def.admin and not bot.is_admin(message.get_sender_contact().addr))
+            or cmd_def.plugin in disabled_plugins
         ):
             reply = f"unknown command {orig_cmd_name!r}"
             self.logger.warn(reply)
             if not message.chat.is_multiuser():
+                suggestion = self.suggest(
+                    orig_cmd_name,
+                    lambda: bot.is_admin(message.get_sender_contact().addr),
+                    disabled_plugins,
+                )
+                if suggestion:
+                    reply += f", did you mean {suggestion}?"
                 replies.add(text=reply)
             return True
 
+        if cmd_def.rate_limit:
+            key = cmd_def.cmd + "/" + message.get_sender_contact().addr
+            if bot.ratelimiter.throttle(key, cmd_def.rate_limit, replies):
+                return True
+
         cmd = IncomingCommand(
             bot=bot, cmd_def=cmd_def, message=message, args=args, payload=payload
         )
         bot.logger.debug(f"processing command {cmd}")
+        timeout = cmd_def.timeout
+        if timeout is None:
+            timeout = self.default_timeout
+        replies.plugin = cmd_def.plugin
         try:
-            res = cmd.cmd_def(
-                command=cmd,
-                replies=replies,
-                bot=bot,
-                payload=cmd.payload,
-                args=cmd.args,
-                message=cmd.message,
+            res = bot.plugins.call_guarded(
+                cmd_def.cmd,
+                cmd_def.plugin,
+                lambda: call_with_timeout(
+                    lambda: replies._stream(
+                        cmd.cmd_def(
+                            command=cmd,
+                            replies=replies,
+                            bot=bot,
+                            payload=cmd.payload,
+                            args=cmd.args,
+                            message=cmd.message,
+                        )
+                    ),
+                    timeout,
+                    self.logger,
+                    cmd_def.cmd,
+                ),
             )
+        except HandlerTimeout:
+            replies.close(text=f"⏱️ command {cmd_def.cmd!r} timed out")
         except Exception as ex:
             self.logger.exception(ex)
         else:
-            assert res is None, res
+            if res is CircuitBreaker.SKIPPED:
+                self.logger.warning(f"command {cmd_def.cmd!r} skipped, breaker open")
+            else:
+                assert res is None, res
         return True
 
 
@@ -135,6 +221,9 @@ class CommandDef:
         args: list,
         admin=False,
         hidden=False,
+        timeout=None,
+        rate_limit=None,
+        plugin=None,
     ) -> None:
         if cmd[0] != CMD_PREFIX:
             raise ValueError(f"cmd {cmd!r} must start with {CMD_PREFIX!r}")
@@ -145,6 +234,10 @@ class CommandDef:
         self.args = args
         self.admin = admin
         self.hidden = hidden
+        self.timeout = timeout
+        self.rate_limit = rate_limit
+        #: name of the python module that defines the command
+        self.plugin = plugin or func.__module__
 
     def __eq__(self, c) -> bool:
         return c.__dict__ == self.__dict__
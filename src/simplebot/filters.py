@@ -1,16 +1,46 @@
+import re
+import time
 from collections import OrderedDict
-from typing import Callable, Dict, Set
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Generator, Optional, Set, Tuple, Union
+
+from deltachat.message import get_viewtype_code_from_name
 
 from .commands import parse_command_docstring
 from .hookspec import deltabot_hookimpl
+from .plugins import CircuitBreaker
+from .utils import HandlerTimeout, RegexSet, call_with_timeout
 
 _filters: Set[tuple] = set()
+CHAT_TYPES = ("single", "group")
 
 
 class Filters:
     def __init__(self, bot) -> None:
         self.logger = bot.logger
+        self.default_timeout = bot.handler_timeout
+        #: incremented every time a filter is registered or unregistered
+        self.version = 0
         self._filter_defs: Dict[str, FilterDef] = OrderedDict()
+        # all filters sorted by priority, None if it needs to be compiled again
+        self._sorted: Optional[Tuple[FilterDef, ...]] = None
+        # message attributes some filter depends on, part of the chains' keys
+        self._uses_admin = False
+        self._uses_viewtype = False
+        self._uses_chat_type = False
+        self._uses_has_file = False
+        # the regex patterns of all filters, searched at once
+        self._regex_set = RegexSet({})
+        # filter chains pre-selected by message attributes, compiled lazily
+        self._chains: Dict[tuple, tuple] = {}
+        #: number of threads running the observer filters
+        self.observer_workers = 4
+        self._observer_pool: Optional[ThreadPoolExecutor] = None
+        #: reorder filters with the same priority by their runtime statistics
+        #: every this number of messages, 0 disables adaptive ordering
+        self.adaptive_interval = 0
+        self._stats: Dict[str, FilterStats] = {}
+        self._messages = 0
         bot.plugins.add_module("filters", self)
 
     def register(
@@ -22,9 +52,18 @@ class Filters:
         trylast: bool = False,
         admin: bool = False,
         hidden: bool = False,
+        timeout: float = None,
+        viewtype: Union[str, tuple] = None,
+        chat_type: str = None,
+        regex: Union[str, re.Pattern] = None,
+        has_file: bool = None,
+        min_len: int = None,
+        observe: bool = False,
     ) -> None:
         """register a filter function that acts on each incoming non-system message.
         :param func: function can accept 'bot', 'message' and 'replies' arguments.
+                     It can be a generator yielding replies like commands do,
+                     its return value decides whether the message is claimed.
         :param name: name of the filter, if not provided it is autogenerated from function name.
         :param help: filter's description, it will be extracted from the function docstring if not provided.
         :param tryfirst: Set to True if the filter should be executed as
@@ -32,6 +71,25 @@ class Filters:
         :param trylast: Set to True if the filter should be executed as
                         late as possible.
         :param admin: if True the filter will activate for bot administrators only.
+        :param timeout: seconds the filter is allowed to run before it is abandoned
+                        and the message processing stops with a timeout notice,
+                        if not provided the bot's default handler timeout is
+                        used, 0 disables it.
+        :param viewtype: only call the filter for messages with this view type,
+                         or any of the view types if a tuple is given.
+        :param chat_type: only call the filter for messages in "single" or
+                          "group" chats.
+        :param regex: only call the filter if the message text matches this
+                      regular expression.
+        :param has_file: only call the filter for messages with (True) or
+                         without (False) an attached file.
+        :param min_len: only call the filter if the message text has at least
+                        this number of characters.
+        :param observe: if True the filter only observes messages and never
+                        claims them, it runs concurrently in a thread pool
+                        out of the message processing critical path, with
+                        its own replies object, and its return value is
+                        ignored.
         """
         name = name or f"{func.__module__}.{func.__name__}"
         if help is None:
@@ -49,36 +107,245 @@ class Filters:
             priority=prio,
             admin=admin,
             hidden=hidden,
+            timeout=timeout,
+            viewtype=viewtype,
+            chat_type=chat_type,
+            regex=regex,
+            has_file=has_file,
+            min_len=min_len,
+            observe=observe,
         )
         if name in self._filter_defs:
             raise ValueError(f"filter {name!r} already registered")
         self._filter_defs[name] = filter_def
+        self._stats[name] = FilterStats()
+        self.version += 1
+        self._sorted = None
         self.logger.debug(f"registered new filter {name!r}")
 
     def unregister(self, name: str) -> Callable:
         """unregister a filter function."""
-        return self._filter_defs.pop(name)
+        filter_def = self._filter_defs.pop(name)
+        self._stats.pop(name, None)
+        self.version += 1
+        self._sorted = None
+        return filter_def
 
     def dict(self) -> dict:
         return self._filter_defs.copy()
 
+    def get_report(self) -> str:
+        """Return a report of the filters in calling order with their statistics."""
+        if self._sorted is None:
+            self._compile()
+        mode = "adaptive" if self.adaptive_interval else "fixed"
+        lines = [f"Filters ({mode} order):"]
+        for filter_def in self._sorted:
+            stats = self._stats[filter_def.name]
+            kind = "observer" if filter_def.observe else f"prio={filter_def.priority}"
+            lines.append(
+                f"{filter_def.name} ({kind}): calls={stats.calls}"
+                f" claims={stats.claim_rate():.0%} avg={stats.avg_cost() * 1000:.2f}ms"
+            )
+        return "\n".join(lines)
+
+    def _sort(self) -> Tuple["FilterDef", ...]:
+        defs = list(self._filter_defs.values())
+        if self.adaptive_interval:
+            # the expected cost per message is minimal calling first the filters
+            # with the lowest cost per claim, unknown filters are tried first
+            # to gather their statistics
+            defs.sort(key=lambda f: (f.priority, self._stats[f.name].rank()))
+        else:
+            defs.sort(key=lambda f: f.priority)
+        return tuple(defs)
+
+    def _reorder(self) -> None:
+        """Sort again the filters by their statistics, the set of filters
+        didn't change so the regex set and attribute flags are kept.
+        """
+        if self._sorted is None:
+            return
+        self._chains.clear()
+        self._sorted = self._sort()
+
+    def _compile(self) -> None:
+        defs = self._sort()
+        self._uses_admin = any(f.admin for f in defs)
+        self._uses_viewtype = any(f.viewtypes is not None for f in defs)
+        self._uses_chat_type = any(f.chat_type is not None for f in defs)
+        self._uses_has_file = any(f.has_file is not None for f in defs)
+        self._regex_set = RegexSet({f.name: f.regex for f in defs if f.regex})
+        self._chains.clear()
+        self._sorted = defs
+
+    def _get_chain(self, bot, message) -> tuple:
+        """Get the claiming filters that can match the given message, in calling
+        order, and the observer filters that can match it.
+        """
+        if self._sorted is None:
+            self._compile()
+        key = (
+            self._uses_admin and bot.is_admin(message.get_sender_contact().addr),
+            message._view_type if self._uses_viewtype else None,
+            message.chat.is_multiuser() if self._uses_chat_type else None,
+            bool(message.filename) if self._uses_has_file else None,
+        )
+        chain = self._chains.get(key)
+        if chain is None:
+            defs = [f for f in self._sorted if f.preselect(*key)]
+            chain = (
+                tuple(f for f in defs if not f.observe),
+                tuple(f for f in defs if f.observe),
+            )
+            self._chains[key] = chain
+        return chain
+
+    def _get_candidates(self, bot, message) -> Generator["FilterDef", None, None]:
+        """Yield the observer filters and then the claiming filters that
+        must be called for the given message, in calling order.
+        """
+        text = message.text
+        matched = None
+        disabled = bot.get_disabled_plugins(message)
+        claimers, observers = self._get_chain(bot, message)
+        for filter_def in observers + claimers:
+            if disabled and filter_def.plugin in disabled:
+                continue
+            if filter_def.min_len and len(text) < filter_def.min_len:
+                continue
+            if filter_def.regex is not None:
+                if matched is None:
+                    matched = self._regex_set.match(text)
+                if filter_def.name not in matched:
+                    continue
+            yield filter_def
+
+    def can_handle(self, bot, message) -> bool:
+        """True if any filter would be called for the given message."""
+        return next(self._get_candidates(bot, message), None) is not None
+
+    def _run_observer(self, filter_def, bot, message) -> None:
+        from .bot import Replies
+
+        replies = Replies(message, self.logger, bot.outbound)
+        replies.plugin = filter_def.plugin
+        try:
+            replies._stream(filter_def(message=message, replies=replies, bot=bot))
+            replies.send_reply_messages()
+        except Exception as ex:
+            self.logger.exception(ex)
+
+    @deltabot_hookimpl
+    def deltabot_init(self, bot, args) -> None:  # noqa
+        self.adaptive_interval = getattr(args, "adaptive_filters", None) or 0
+
     @deltabot_hookimpl(trylast=True)
     def deltabot_incoming_message(self, bot, message, replies) -> None:
-        is_admin = bot.is_admin(message.get_sender_contact().addr)
-        for name, filter_def in sorted(
-            self._filter_defs.items(), key=lambda e: e[1].priority
-        ):
-            if filter_def.admin and not is_admin:
+        self._messages += 1
+        if self.adaptive_interval and self._messages % self.adaptive_interval == 0:
+            self._reorder()
+        for filter_def in self._get_candidates(bot, message):
+            name = filter_def.name
+            if filter_def.observe:
+                self.logger.debug("scheduling observer %r", name)
+                if self._observer_pool is None:
+                    self._observer_pool = ThreadPoolExecutor(
+                        max_workers=self.observer_workers,
+                        thread_name_prefix="filter-observer",
+                    )
+                self._observer_pool.submit(self._run_observer, filter_def, bot, message)
                 continue
-            self.logger.debug(f"calling filter {name!r} on message id={message.id}")
-            if filter_def(message=message, replies=replies, bot=bot):
+            self.logger.debug("calling filter %r on message id=%s", name, message.id)
+            timeout = filter_def.timeout
+            if timeout is None:
+                timeout = self.default_timeout
+            stats = self._stats[name]
+            replies.plugin = filter_def.plugin
+            start = time.perf_counter()
+            try:
+                res = bot.plugins.call_guarded(
+                    name,
+                    filter_def.plugin,
+                    lambda: call_with_timeout(
+                        lambda: replies._stream(
+                            filter_def(message=message, replies=replies, bot=bot)
+                        ),
+                        timeout,
+                        self.logger,
+                        name,
+                    ),
+                )
+            except HandlerTimeout:
+                replies.close(text=f"⏱️ filter {name!r} timed out")
                 return
+            except Exception as ex:
+                if not bot.plugins.breaker_threshold:
+                    raise
+                self.logger.exception(ex)
+                continue
+            finally:
+                stats.calls += 1
+                stats.elapsed += time.perf_counter() - start
+            if res is CircuitBreaker.SKIPPED:
+                self.logger.debug("filter %r skipped, breaker open", name)
+                continue
+            if res:
+                stats.claims += 1
+                return
+
+    @deltabot_hookimpl
+    def deltabot_shutdown(self, bot) -> None:  # noqa
+        if self._observer_pool is not None:
+            self._observer_pool.shutdown(wait=False)
+
+
+class FilterStats:
+    """Runtime statistics of a filter."""
+
+    __slots__ = ("calls", "claims", "elapsed")
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.claims = 0
+        self.elapsed = 0.0
+
+    def avg_cost(self) -> float:
+        return self.elapsed / self.calls if self.calls else 0.0
+
+    def claim_rate(self) -> float:
+        return self.claims / self.calls if self.calls else 0.0
+
+    def rank(self) -> float:
+        """Average cost per claimed message, lower is better."""
+        if not self.calls:
+            return 0.0
+        if not self.claims:
+            return float("inf")
+        return self.elapsed / self.claims
 
 
 class FilterDef:
     """Definition of a Filter that acts on incoming messages."""
 
-    def __init__(self, name, short, long, func, args, priority, admin, hidden) -> None:
+    def __init__(
+        self,
+        name,
+        short,
+        long,
+        func,
+        args,
+        priority,
+        admin,
+        hidden,
+        timeout=None,
+        viewtype=None,
+        chat_type=None,
+        regex=None,
+        has_file=None,
+        min_len=None,
+        observe=False,
+    ) -> None:
         self.name = name
         self.short = short
         self.long = long
@@ -87,6 +354,38 @@ class FilterDef:
         self.priority = priority
         self.admin = admin
         self.hidden = hidden
+        self.timeout = timeout
+        if isinstance(viewtype, str):
+            viewtype = (viewtype,)
+        self.viewtypes = (
+            None
+            if viewtype is None
+            else frozenset(get_viewtype_code_from_name(v) for v in viewtype)
+        )
+        if chat_type is not None and chat_type not in CHAT_TYPES:
+            raise ValueError(f"chat_type must be one of {CHAT_TYPES!r}")
+        self.chat_type = chat_type
+        self.regex = re.compile(regex) if isinstance(regex, str) else regex
+        self.has_file = has_file
+        self.min_len = min_len
+        self.observe = observe
+        #: name of the python module that defines the filter
+        self.plugin = func.__module__
+
+    def preselect(self, is_admin, viewtype, is_group, has_file) -> bool:
+        """True if the filter can match a message with the given attributes.
+
+        None attributes are unknown and are not used to discard the filter.
+        """
+        if self.admin and not is_admin:
+            return False
+        if self.viewtypes is not None and viewtype not in self.viewtypes:
+            return False
+        if self.chat_type is not None and is_group != (self.chat_type == "group"):
+            return False
+        if self.has_file is not None and has_file != self.has_file:
+            return False
+        return True
 
     def __eq__(self, c) -> bool:
         return c.__dict__ == self.__dict__
@@ -0,0 +1,117 @@
+import threading
+import time
+from collections import OrderedDict, defaultdict, deque
+from typing import Dict, List, Optional
+
+PERCENTILES = (50, 90, 99)
+
+
+class LatencyTracker:
+    """Track how long the replies take from the arrival of the incoming
+    message to their delivery to the SMTP server.
+
+    The timestamps of the incoming arrival, the completion of the message
+    hooks, the `send_msg` call and the delivery are correlated by message id.
+    Only the last `max_samples` delivered replies are kept, the messages
+    still being processed or delivered are also bounded by `max_samples`.
+    """
+
+    def __init__(self, max_samples: int = 1000) -> None:
+        self.max_samples = max_samples
+        # incoming message id -> [arrived, processed]
+        self._incoming: Dict[int, list] = OrderedDict()
+        # outgoing message id -> (plugin, chat type, arrived, processed, sent)
+        self._outgoing: Dict[int, tuple] = OrderedDict()
+        # (plugin, chat type, processing, sending, delivery) in seconds
+        self._samples: deque = deque(maxlen=max_samples)
+        self._lock = threading.Lock()
+
+    def arrived(self, msg_id: int) -> None:
+        """Record the arrival of an incoming message."""
+        with self._lock:
+            self._incoming[msg_id] = [time.time(), None]
+            self._trim(self._incoming)
+
+    def processed(self, msg_id: int) -> None:
+        """Record that the hooks finished processing an incoming message."""
+        with self._lock:
+            times = self._incoming.get(msg_id)
+            if times is not None:
+                times[1] = time.time()
+
+    def sent(
+        self, incoming_id: int, msg_id: int, plugin: Optional[str], chat_type: str
+    ) -> None:
+        """Record that a reply to the given incoming message was handed to
+        the core to be sent.
+        """
+        now = time.time()
+        with self._lock:
+            times = self._incoming.get(incoming_id)
+            if times is None:
+                return
+            arrived, processed = times
+            # replies flushed by a handler are sent before the hooks finish
+            if processed is None or processed > now:
+                processed = now
+            self._outgoing[msg_id] = (plugin, chat_type, arrived, processed, now)
+            self._trim(self._outgoing)
+
+    def delivered(self, msg_id: int) -> None:
+        """Record the delivery of an outgoing message to the SMTP server."""
+        now = time.time()
+        with self._lock:
+            record = self._outgoing.pop(msg_id, None)
+            if record is None:
+                return
+            plugin, chat_type, arrived, processed, sent = record
+            self._samples.append(
+                (plugin, chat_type, processed - arrived, sent - processed, now - sent)
+            )
+
+    def get_stats(self) -> Dict[str, Dict[str, List[float]]]:
+        """Return the total latency percentiles in seconds, by plugin and
+        by chat type, and of each stage.
+        """
+        with self._lock:
+            samples = list(self._samples)
+        groups: Dict[str, Dict[str, List[float]]] = defaultdict(
+            lambda: defaultdict(list)
+        )
+        for plugin, chat_type, processing, sending, delivery in samples:
+            total = processing + sending + delivery
+            groups["stage"]["processing"].append(processing)
+            groups["stage"]["sending"].append(sending)
+            groups["stage"]["delivery"].append(delivery)
+            groups["stage"]["total"].append(total)
+            groups["plugin"][plugin or "other"].append(total)
+            groups["chat"][chat_type].append(total)
+        return {
+            group: {name: percentiles(values) for name, values in values_by.items()}
+            for group, values_by in groups.items()
+        }
+
+    def get_report(self) -> str:
+        header = "/".join(f"p{p}" for p in PERCENTILES)
+        lines = [
+            f"Latency: samples={len(self._samples)} pending={len(self._outgoing)}"
+            f" ({header} ms)"
+        ]
+        for group, stats in sorted(self.get_stats().items()):
+            for name, values in sorted(stats.items()):
+                values_str = "/".join(f"{v * 1000:.0f}" for v in values)
+                lines.append(f"  {group} {name}: {values_str}")
+        return "\n".join(lines)
+
+    def _trim(self, entries: dict) -> None:
+        while len(entries) > self.max_samples:
+            entries.popitem(last=False)  # type: ignore
+
+
+def percentiles(values: List[float]) -> List[float]:
+    """Return the nearest-rank percentiles in PERCENTILES of the values."""
+    values = sorted(values)
+    return [
+        values[max(0, min(len(values) - 1, -(-p * len(values) // 100) - 1))]
+        for p in PERCENTILES
+    ]
@@ -0,0 +1,129 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from tempfile import NamedTemporaryFile
+from typing import Dict, Optional
+
+from PIL import Image, ImageOps
+
+from .blobcache import split_filename
+from .utils import COPY_CHUNK_SIZE
+
+# Pillow format -> save options, other formats (ex. animated GIF) are sent as is
+IMAGE_FORMATS = {"JPEG": "quality", "WEBP": "quality", "PNG": "optimize"}
+IMAGE_SUFFIXES = (".jpg", ".jpeg", ".jpe", ".jfif", ".png", ".webp")
+
+
+class ImageShrinker:
+    """Downscale and recompress the images attached to the replies.
+
+    Images with a side longer than `max_side` pixels are downscaled, images
+    bigger than `max_bytes` are recompressed with the given JPEG/WebP
+    `quality`. The result is only used if it is smaller than the original,
+    images that can't be decoded are sent unchanged.
+    The results are cached by the digest of the original content, so sending
+    the same image again doesn't decode it again.
+    """
+
+    def __init__(
+        self,
+        logger,
+        max_side: int = None,
+        max_bytes: int = None,
+        quality: int = 85,
+        cache_size: int = 1000,
+    ) -> None:
+        self.logger = logger
+        self.max_side = max_side
+        self.max_bytes = max_bytes
+        self.quality = quality
+        self.cache_size = cache_size
+        self.shrunk = 0
+        self.failed = 0
+        self.hits = 0
+        self.saved = 0
+        # content digest -> path of the shrunk image, None if it was kept
+        self._cache: Dict[str, Optional[str]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def process(self, path: str, blobdir: str) -> str:
+        """Return the path of the shrunk image, written to the blobdir, or
+        the given path if it isn't an image over the limits.
+        """
+        if not path.lower().endswith(IMAGE_SUFFIXES):
+            return path
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(COPY_CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+        key = digest.hexdigest()
+        with self._lock:
+            if key in self._cache:
+                result = self._cache[key]
+                self._cache.move_to_end(key)  # type: ignore
+                if result is None or os.path.exists(result):
+                    self.hits += 1
+                    return result or path
+        failed = False
+        try:
+            result = self._shrink(path, blobdir, key)
+        except Exception as ex:
+            # truncated, corrupted or decompression bomb images are sent as is
+            self.logger.warning(f"can't shrink image {path!r}: {ex!r}")
+            failed = True
+            result = None
+        with self._lock:
+            self.failed += failed
+            self._cache[key] = result
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)  # type: ignore
+            if result is not None:
+                self.shrunk += 1
+                self.saved += os.path.getsize(path) - os.path.getsize(result)
+        return result or path
+
+    def _shrink(self, path: str, blobdir: str, key: str) -> Optional[str]:
+        size = os.path.getsize(path)
+        with Image.open(path) as img:
+            option = IMAGE_FORMATS.get(img.format)
+            if option is None or getattr(img, "is_animated", False):
+                return None
+            too_big = bool(self.max_bytes and size > self.max_bytes)
+            too_large = bool(self.max_side and max(img.size) > self.max_side)
+            if not too_big and not too_large:
+                return None
+            fmt = img.format
+            img = ImageOps.exif_transpose(img)
+            if too_large:
+                img.thumbnail((self.max_side, self.max_side), Image.LANCZOS)
+            if fmt == "JPEG" and img.mode not in ("RGB", "L"):
+                img = img.convert("RGB")
+            prefix, suffix = split_filename(os.path.basename(path))
+            with NamedTemporaryFile(
+                dir=blobdir, prefix=prefix, suffix=suffix, delete=False
+            ) as fp:
+                tmp_path = fp.name
+            try:
+                if option == "quality":
+                    img.save(tmp_path, fmt, quality=self.quality)
+                else:
+                    img.save(tmp_path, fmt, optimize=True)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+        if os.path.getsize(tmp_path) >= size:
+            os.remove(tmp_path)
+            return None
+        result = os.path.join(blobdir, f"{prefix}{key[:16]}-small{suffix or ''}")
+        os.replace(tmp_path, result)
+        return result
+
+    def get_report(self) -> str:
+        return (
+            f"Image shrinker: shrunk={self.shrunk} hits={self.hits} failed={self.failed}"
+            f" saved={self.saved / 2**20:.1f}MB"
+        )
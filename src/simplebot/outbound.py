@@ -0,0 +1,161 @@
+import queue
+import threading
+import time
+from typing import FrozenSet, List, Optional
+
+from .hookspec import deltabot_hookimpl
+
+
+class OutboundQueue:
+    """Pipeline sending the replies from its own worker threads.
+
+    Processing of incoming messages hands the replies off and continues
+    right away. Each chat is always served by the same worker, so the
+    replies to a chat are sent in order. With 0 workers (the default)
+    the replies are sent synchronously by the message processing thread.
+
+    If the sent messages are throttled by a send limiter, the priority
+    replies (to 1:1 chats and to administrators) are served by their own
+    workers, so they don't wait behind the other replies waiting for a
+    token. Priority and other replies to the same group aren't ordered.
+    """
+
+    def __init__(self, bot, workers: int = 0, max_depth: int = None) -> None:
+        self.logger = bot.logger
+        #: number of worker threads sending replies, 0 to send synchronously
+        self.workers = workers
+        #: maximum number of queued replies per worker, processing blocks
+        #: when it is reached, 0 means no limit
+        self.max_depth = 1000 if max_depth is None else max_depth
+        #: :class:`simplebot.blobcache.BlobCache` deduplicating the attachments,
+        #: None to write a new blob for every attachment
+        self.blob_cache = None
+        #: maximum size in characters of the messages consecutive plain text
+        #: replies to the same chat are merged into, 0 disables coalescing
+        self.coalesce_limit = 0
+        #: plugins (module names) whose replies are never coalesced
+        self.coalesce_exclude: FrozenSet[str] = frozenset()
+        #: :class:`simplebot.ratelimit.SendLimiter` throttling the sent
+        #: messages, None means no limit
+        self.limiter = None
+        #: :class:`simplebot.scheduler.Scheduler` keeping the replies to send later
+        self.scheduler = None
+        #: :class:`simplebot.latency.LatencyTracker` measuring the delivery
+        #: latency of the replies, None to disable it
+        self.latency = None
+        #: :class:`simplebot.media.ImageShrinker` downscaling the attached
+        #: images, None to send them unchanged
+        self.media = None
+        self.sent = 0
+        self.failed = 0
+        self.peak_depth = 0
+        # total seconds the sent replies waited in the queue
+        self.waited = 0.0
+        self._queues: List[queue.Queue] = []
+        # queues of the priority replies, only used with a send limiter
+        self._priority_queues: List[queue.Queue] = []
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+
+    def submit(self, replies, reply: tuple) -> bool:
+        """Queue the reply to be sent by a worker.
+
+        Returns False if the pipeline is synchronous and the reply must be
+        sent by the caller.
+        """
+        if not self.workers:
+            return False
+        if not self._queues:
+            self._start()
+        chat = reply[7] or replies.incoming_message.chat
+        queues = self._queues
+        if self._priority_queues and self.limiter.is_priority(
+            chat, replies.incoming_message
+        ):
+            queues = self._priority_queues
+        q = queues[chat.id % len(queues)]
+        q.put((time.time(), replies, reply))
+        depth = self.depth()
+        if depth > self.peak_depth:
+            self.peak_depth = depth
+        return True
+
+    def depth(self) -> int:
+        """Number of replies waiting to be sent."""
+        return sum(q.qsize() for q in self._queues + self._priority_queues)
+
+    def get_report(self) -> str:
+        if not self.workers:
+            lines = ["Outbound queue disabled, replies are sent synchronously"]
+        else:
+            avg_wait = self.waited / self.sent if self.sent else 0.0
+            lines = [
+                f"Outbound queue: workers={self.workers} depth={self.depth()}"
+                f" peak={self.peak_depth} sent={self.sent} failed={self.failed}"
+                f" avg_wait={avg_wait * 1000:.1f}ms"
+            ]
+        if self.limiter is not None:
+            lines.append(self.limiter.get_report())
+        if self.scheduler is not None:
+            lines.append(self.scheduler.get_report())
+        if self.blob_cache is not None:
+            lines.append(self.blob_cache.get_report())
+        if self.media is not None:
+            lines.append(self.media.get_report())
+        if self.latency is not None:
+            lines.append(self.latency.get_report())
+        return "\n".join(lines)
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        """Stop the workers once the queued replies are sent."""
+        for q in self._queues + self._priority_queues:
+            q.put(None)
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+        self._queues.clear()
+        self._priority_queues.clear()
+        self._threads.clear()
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._queues:
+                return
+            lanes = [("outbound", self._queues)]
+            if self.limiter is not None:
+                lanes.append(("outbound-priority", self._priority_queues))
+            for name, queues in lanes:
+                for i in range(self.workers):
+                    q: queue.Queue = queue.Queue(maxsize=self.max_depth)
+                    thread = threading.Thread(
+                        target=self._worker,
+                        args=(q,),
+                        name=f"{name}-{i}",
+                        daemon=True,
+                    )
+                    thread.start()
+                    self._threads.append(thread)
+                    queues.append(q)
+
+    def _worker(self, q: queue.Queue) -> None:
+        while True:
+            item = q.get()
+            if item is None:
+                break
+            queued_at, replies, reply = item
+            try:
+                msg = replies._send_reply(reply)
+            except Exception as ex:
+                with self._lock:
+                    self.failed += 1
+                self.logger.exception(ex)
+            else:
+                with self._lock:
+                    self.sent += 1
+                    self.waited += time.time() - queued_at
+                self.logger.debug(
+                    f"reply id={msg.id} chat={msg.chat} sent with text: {msg.text[:50]!r}"
+                )
+
+    @deltabot_hookimpl
+    def deltabot_shutdown(self, bot) -> None:  # noqa
+        self.join(timeout=10)
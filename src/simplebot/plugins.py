@@ -1,7 +1,14 @@
+import time
+from typing import Callable, Dict, Optional, Tuple
+
 import pluggy  # type: ignore
 
 from .hookspec import SPEC_NAME, DeltaBotSpecs
 
+# builtin plugins dispatching to other plugins' handlers, the handlers have
+# their own circuit breakers instead
+UNGUARDED_PLUGINS = ("commands", "filters", "ratelimiter")
+
 
 class Plugins:
     def __init__(self, logger, plugin_manager) -> None:
@@ -9,17 +16,148 @@ class Plugins:
         self._pm = plugin_manager
         self.logger = logger
         self.hook = self._pm.hook
+        #: incremented every time a plugin is added or removed
+        self.version = 0
+        #: call the hooks with :meth:`call` bypassing pluggy's per-call overhead
+        self.fast_dispatch = False
+        # hook name -> (firstresult, [(plugin name, function, argnames), ...]
+        # in calling order)
+        self._compiled: Dict[str, Tuple[bool, Optional[list]]] = {}
+        #: consecutive failed or slow calls after which a hook implementation
+        #: is skipped for a while, 0 disables the circuit breakers
+        self.breaker_threshold = 0
+        #: seconds after which a hook implementation call is considered slow,
+        #: None means calls are never slow
+        self.breaker_slow: Optional[float] = None
+        #: seconds a tripped hook implementation is skipped before it is retried,
+        #: doubled every time the retry fails up to `breaker_max_backoff`
+        self.breaker_backoff = 30.0
+        self.breaker_max_backoff = 600.0
+        self._breakers: Dict[Tuple[str, str], CircuitBreaker] = {}
 
     def add_module(self, name, module) -> None:
         """add a named simplebot plugin python module."""
         self.logger.debug(f"registering plugin {name!r}")
         self._pm.register(plugin=module, name=name)
         self._pm.check_pending()
+        self.version += 1
+        self._compiled.clear()
 
     def remove(self, name) -> None:
         """remove a named simplebot plugin."""
         self.logger.debug(f"removing plugin {name!r}")
         self._pm.unregister(name=name)
+        self.version += 1
+        self._compiled.clear()
+
+    def call(self, name: str, **kwargs):
+        """call the named hook, same as `self.hook.<name>(**kwargs)`.
+
+        If `fast_dispatch` is enabled, the hook implementations are called
+        directly from a call list compiled once per added or removed plugin.
+        If `breaker_threshold` is set, the implementations failing or being
+        slow that number of consecutive times are skipped until their
+        circuit breaker allows retrying them.
+        Hooks with wrapper implementations are always called through pluggy.
+        """
+        if not (self.fast_dispatch or self.breaker_threshold):
+            return getattr(self.hook, name)(**kwargs)
+        compiled = self._compiled.get(name)
+        if compiled is None:
+            compiled = self._compiled[name] = self._compile(name)
+        firstresult, impls = compiled
+        if impls is None:
+            return getattr(self.hook, name)(**kwargs)
+        results = []
+        # most implementations take the same arguments, build them only once
+        args_cache: dict = {}
+        for plugin_name, func, argnames in impls:
+            args = args_cache.get(argnames)
+            if args is None:
+                args = args_cache[argnames] = [kwargs[arg] for arg in argnames]
+            if self.breaker_threshold and plugin_name not in UNGUARDED_PLUGINS:
+                res = self._call_guarded(name, plugin_name, func, args)
+                if res is CircuitBreaker.SKIPPED:
+                    continue
+            else:
+                res = func(*args)
+            if res is not None:
+                if firstresult:
+                    return res
+                results.append(res)
+        return None if firstresult else results
+
+    def call_guarded(self, name: str, plugin_name: str, func: Callable):
+        """Call func() through the circuit breaker of the named handler of
+        the given plugin, return `CircuitBreaker.SKIPPED` if it is open.
+
+        Used to guard the commands and filters separately, so a misbehaving
+        handler doesn't take down the others. If `breaker_threshold` is 0,
+        func() is called directly.
+        """
+        if not self.breaker_threshold:
+            return func()
+        return self._call_guarded(name, plugin_name, func, ())
+
+    def _call_guarded(self, name: str, plugin_name: str, func, args):
+        key = (name, plugin_name)
+        breaker = self._breakers.get(key)
+        if breaker is None:
+            breaker = self._breakers[key] = CircuitBreaker()
+        start = time.time()
+        if not breaker.allow(start):
+            return CircuitBreaker.SKIPPED
+        try:
+            res = func(*args)
+        except Exception:
+            self._record(breaker, key, False, start)
+            raise
+        elapsed = time.time() - start
+        if self.breaker_slow and elapsed > self.breaker_slow:
+            self.logger.warning(
+                f"{plugin_name!r} took {elapsed:.2f} seconds to process {name!r}"
+            )
+            self._record(breaker, key, False, start)
+        else:
+            self._record(breaker, key, True, start)
+        return res
+
+    def _record(self, breaker, key: tuple, success: bool, now: float) -> None:
+        if success:
+            if breaker.state != CircuitBreaker.CLOSED:
+                self.logger.info(f"circuit breaker of {key[1]!r} in {key[0]!r} closed")
+            breaker.close()
+        elif breaker.fail(
+            now, self.breaker_threshold, self.breaker_backoff, self.breaker_max_backoff
+        ):
+            self.logger.warning(
+                f"circuit breaker of {key[1]!r} in {key[0]!r} opened,"
+                f" retrying in {breaker.backoff:.0f} seconds"
+            )
+
+    def get_breakers_report(self) -> str:
+        """Return a report of the hook implementations' circuit breakers."""
+        if not self.breaker_threshold:
+            return "Circuit breakers are disabled"
+        lines = ["Circuit breakers:"]
+        now = time.time()
+        for (name, plugin_name), breaker in sorted(self._breakers.items()):
+            line = f"{plugin_name} ({name}): {breaker.state}"
+            if breaker.state == CircuitBreaker.OPEN:
+                line += f", retry in {max(0, breaker.retry_at - now):.0f}s"
+            lines.append(line + f", failures={breaker.failures} trips={breaker.trips}")
+        return "\n".join(lines)
+
+    def _compile(self, name: str) -> Tuple[bool, Optional[list]]:
+        caller = getattr(self.hook, name)
+        firstresult = bool(caller.spec and caller.spec.opts.get("firstresult"))
+        impls = []
+        # pluggy calls the implementations in reverse registration order
+        for impl in reversed(caller.get_hookimpls()):
+            if impl.hookwrapper or getattr(impl, "wrapper", False):
+                return firstresult, None
+            impls.append((impl.plugin_name, impl.function, impl.argnames))
+        return firstresult, impls
 
     def dict(self) -> dict:
         """return a dict name->simplebot plugin object mapping."""
@@ -30,6 +168,57 @@ class Plugins:
         return self._pm.list_name_plugin()
 
 
+class CircuitBreaker:
+    """Tracks the consecutive failures of a hook implementation."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+    #: returned instead of a result when the call was skipped
+    SKIPPED = object()
+
+    __slots__ = ("state", "failures", "trips", "backoff", "retry_at")
+
+    def __init__(self) -> None:
+        self.state = self.CLOSED
+        self.failures = 0
+        self.trips = 0
+        self.backoff = 0.0
+        self.retry_at = 0.0
+
+    def allow(self, now: float) -> bool:
+        """True if the implementation can be called, an open breaker lets
+        a single trial call through once its backoff expired.
+        """
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and now >= self.retry_at:
+            self.state = self.HALF_OPEN
+            return True
+        return False
+
+    def close(self) -> None:
+        self.state = self.CLOSED
+        self.failures = 0
+        self.backoff = 0.0
+
+    def fail(
+        self, now: float, threshold: int, backoff: float, max_backoff: float
+    ) -> bool:
+        """Record a failed call, return True if the breaker was opened."""
+        self.failures += 1
+        if self.state == self.HALF_OPEN:
+            self.backoff = min(self.backoff * 2, max_backoff)
+        elif self.failures >= threshold:
+            self.backoff = backoff
+        else:
+            return False
+        self.state = self.OPEN
+        self.retry_at = now + self.backoff
+        self.trips += 1
+        return True
+
+
 _pm = None
 
 
@@ -164,7 +164,7 @@ def mocker(mock_bot):
                 regex = re.compile(filters)
                 for name in list(self.bot.filters._filter_defs.keys()):
                     if not regex.match(name):
-                        del self.bot.filters._filter_defs[name]
+                        self.bot.filters.unregister(name)
             if not msg:
                 msg = self.make_incoming_message(
                     text=text,
@@ -176,9 +176,10 @@ def mocker(mock_bot):
                     addr=addr,
                     quote=quote,
                 )
-            replies = Replies(msg, self.bot.logger)
-            self.bot.plugins.hook.deltabot_incoming_message(
-                message=msg, replies=replies, bot=self.bot
+            replies = Replies(msg, self.bot.logger, self.bot.outbound)
+            self.bot.annotations.of(msg)
+            self.bot.plugins.call(
+                "deltabot_incoming_message", message=msg, replies=replies, bot=self.bot
             )
             return replies.send_reply_messages()
 
@@ -0,0 +1,278 @@
+import threading
+import time
+from typing import Dict, Optional, Tuple, Union
+
+from .hookspec import deltabot_hookimpl
+
+
+def parse_rate(value: Union[str, tuple, None]) -> Optional[Tuple[int, float]]:
+    """Parse a rate limit given as a (calls, seconds) tuple or "CALLS/SECONDS" string.
+
+    Returns None if the value is empty, meaning no limit.
+    """
+    if not value:
+        return None
+    if isinstance(value, str):
+        calls, _, seconds = value.partition("/")
+        value = (int(calls), float(seconds or 1))
+    calls, seconds = value
+    if calls <= 0 or seconds <= 0:
+        raise ValueError(f"invalid rate limit: {value!r}")
+    return (int(calls), float(seconds))
+
+
+class TokenBucket:
+    """Bucket holding up to `calls` tokens, refilled at calls/seconds tokens per second."""
+
+    __slots__ = ("calls", "seconds", "capacity", "rate", "tokens", "stamp")
+
+    def __init__(
+        self, calls: int, seconds: float, tokens: float = None, stamp: float = None
+    ) -> None:
+        self.calls = calls
+        self.seconds = seconds
+        self.capacity = float(calls)
+        self.rate = calls / seconds
+        self.tokens = self.capacity if tokens is None else tokens
+        self.stamp = time.time() if stamp is None else stamp
+
+    def refill(self, now: float) -> None:
+        if now > self.stamp:
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.stamp) * self.rate
+            )
+            self.stamp = now
+
+    def consume(self, now: float = None) -> bool:
+        """Take a token, return False if the bucket is empty."""
+        self.refill(time.time() if now is None else now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def wait_time(self, now: float = None) -> float:
+        """Seconds until a token is available."""
+        self.refill(time.time() if now is None else now)
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+    def is_full(self, now: float) -> bool:
+        self.refill(now)
+        return self.tokens >= self.capacity
+
+
+class RateLimiter:
+    """Per-key token buckets kept in memory and checkpointed to the bot's database.
+
+    The global per-sender limit is enforced before any command or filter runs,
+    only on the messages that are commands or would be handled by a filter,
+    commands can have their own limit with the `rate_limit` argument.
+    """
+
+    def __init__(self, bot, rate_limit=None, checkpoint_interval: float = 60) -> None:
+        self.bot = bot
+        self.logger = bot.logger
+        #: global per-sender (calls, seconds) limit, None means no limit
+        self.rate_limit = parse_rate(rate_limit)
+        self.checkpoint_interval = checkpoint_interval
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._noticed: Dict[str, float] = {}
+        self._dirty: set = set()
+        self._loaded = False
+        self._last_checkpoint = time.time()
+        self._lock = threading.Lock()
+
+    def _get_db(self):
+        return self.bot.plugins._pm.get_plugin(name="db")
+
+    def allow(self, key: str, limit: Tuple[int, float]) -> bool:
+        """Consume a token from the bucket of the given key."""
+        now = time.time()
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            bucket = self._buckets.get(key)
+            if bucket is None or (bucket.calls, bucket.seconds) != limit:
+                bucket = self._buckets[key] = TokenBucket(*limit, stamp=now)
+            allowed = bucket.consume(now)
+            self._dirty.add(key)
+            if now - self._last_checkpoint > self.checkpoint_interval:
+                self._checkpoint(now)
+        return allowed
+
+    def notify(self, key: str, limit: Tuple[int, float], replies) -> None:
+        """Tell the sender it is being throttled, at most once per rate limit window."""
+        self.logger.debug(f"rate limit exceeded for {key!r}")
+        now = time.time()
+        with self._lock:
+            if self._noticed.get(key, 0) > now:
+                return
+            self._noticed[key] = now + limit[1]
+        replies.add(text="⏳ Too many requests, please try again later")
+
+    def throttle(self, key: str, limit: Tuple[int, float], replies) -> bool:
+        """Return True if the invocation must be dropped."""
+        if self.allow(key, limit):
+            return False
+        self.notify(key, limit, replies)
+        return True
+
+    def checkpoint(self) -> None:
+        """Save the modified buckets to the database."""
+        with self._lock:
+            self._checkpoint(time.time())
+
+    def _load(self) -> None:
+        self._loaded = True
+        db = self._get_db()
+        if db is None:
+            return
+        for key, calls, seconds, tokens, stamp in db.get_rate_limits():
+            self._buckets[key] = TokenBucket(calls, seconds, tokens, stamp)
+
+    def _checkpoint(self, now: float) -> None:
+        self._last_checkpoint = now
+        db = self._get_db()
+        if db is None:
+            return
+        updated, deleted = [], []
+        for key, bucket in list(self._buckets.items()):
+            if bucket.is_full(now):
+                # a full bucket is the same as no bucket
+                del self._buckets[key]
+                deleted.append(key)
+            elif key in self._dirty:
+                updated.append(
+                    (key, bucket.calls, bucket.seconds, bucket.tokens, bucket.stamp)
+                )
+        self._dirty.clear()
+        for key, stamp in list(self._noticed.items()):
+            if stamp <= now:
+                del self._noticed[key]
+        db.set_rate_limits(updated, deleted)
+
+    @deltabot_hookimpl(tryfirst=True)
+    def deltabot_incoming_message(self, bot, message, replies) -> Optional[bool]:
+        if self.rate_limit is None:
+            return None
+        if bot.annotations.of(message)["command"] is None and not (
+            bot.filters.can_handle(bot, message)
+        ):
+            return None
+        addr = message.get_sender_contact().addr
+        if self.allow(addr, self.rate_limit) or bot.is_admin(addr):
+            return None
+        if message.chat.is_multiuser():
+            # don't disturb the other members of the group
+            self.logger.debug(f"rate limit exceeded for {addr!r}")
+        else:
+            self.notify(addr, self.rate_limit, replies)
+        return True
+
+    @deltabot_hookimpl
+    def deltabot_shutdown(self, bot) -> None:  # noqa
+        self.checkpoint()
+
+
+class SendLimiter:
+    """Global and per-chat token buckets throttling the outgoing messages.
+
+    Senders block until both buckets have a token. Replies to 1:1 chats and
+    to bot administrators have priority: while any of them is waiting, other
+    replies don't take tokens from the global bucket. Priority only matters
+    with concurrent senders, when the replies are sent synchronously by the
+    message processing thread they are sent in order.
+    """
+
+    def __init__(self, bot, rate_limit=None, chat_rate_limit=None) -> None:
+        self.bot = bot
+        #: global (calls, seconds) limit, None means no limit
+        self.rate_limit = parse_rate(rate_limit)
+        #: per-chat (calls, seconds) limit, None means no limit
+        self.chat_rate_limit = parse_rate(chat_rate_limit)
+        self.sent = 0
+        self.delayed = 0
+        #: total and maximum seconds the messages waited for a token
+        self.waited = 0.0
+        self.max_wait = 0.0
+        #: number of senders currently waiting for a token
+        self.waiting = 0
+        self._priority_waiting = 0
+        self._bucket = TokenBucket(*self.rate_limit) if self.rate_limit else None
+        self._chat_buckets: Dict[int, TokenBucket] = {}
+        self._cond = threading.Condition()
+
+    def is_priority(self, chat, incoming_message) -> bool:
+        if not chat.is_multiuser():
+            return True
+        return self.bot.is_admin(incoming_message.get_sender_contact().addr)
+
+    def acquire(self, chat, incoming_message=None, priority: bool = None) -> float:
+        """Block until a message can be sent to the chat, return the seconds waited.
+
+        If priority is not given, it is decided from the chat and the sender
+        of the incoming message the message replies to.
+        """
+        if priority is None:
+            priority = self._bucket is not None and self.is_priority(
+                chat, incoming_message
+            )
+        start = time.time()
+        with self._cond:
+            chat_bucket = self._get_chat_bucket(chat.id, start)
+            self.waiting += 1
+            self._priority_waiting += priority
+            delayed = False
+            try:
+                while True:
+                    now = time.time()
+                    wait = 0.0
+                    if chat_bucket is not None:
+                        wait = chat_bucket.wait_time(now)
+                    if self._bucket is not None:
+                        if not priority and self._priority_waiting:
+                            # let the priority senders go first
+                            wait = max(wait, self._bucket.wait_time(now), 0.01)
+                        else:
+                            wait = max(wait, self._bucket.wait_time(now))
+                    if wait <= 0:
+                        break
+                    delayed = True
+                    self._cond.wait(timeout=wait)
+                if chat_bucket is not None:
+                    chat_bucket.consume(now)
+                if self._bucket is not None:
+                    self._bucket.consume(now)
+            finally:
+                self.waiting -= 1
+                self._priority_waiting -= priority
+                self._cond.notify_all()
+            waited = now - start if delayed else 0.0
+            self.sent += 1
+            if delayed:
+                self.delayed += 1
+                self.waited += waited
+                self.max_wait = max(self.max_wait, waited)
+        return waited
+
+    def _get_chat_bucket(self, chat_id: int, now: float) -> Optional[TokenBucket]:
+        if self.chat_rate_limit is None:
+            return None
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) >= 1000:
+                # a full bucket is the same as no bucket
+                for key, old in list(self._chat_buckets.items()):
+                    if old.is_full(now):
+                        del self._chat_buckets[key]
+            bucket = TokenBucket(*self.chat_rate_limit, stamp=now)
+            self._chat_buckets[chat_id] = bucket
+        return bucket
+
+    def get_report(self) -> str:
+        avg_wait = self.waited / self.delayed if self.delayed else 0.0
+        return (
+            f"Send rate limit: global={self.rate_limit} chat={self.chat_rate_limit}"
+            f" waiting={self.waiting} sent={self.sent} delayed={self.delayed}"
+            f" avg_wait={avg_wait:.2f}s max_wait={self.max_wait:.2f}s"
+        )
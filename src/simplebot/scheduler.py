@@ -0,0 +1,138 @@
+import json
+import threading
+import time
+from datetime import datetime
+from typing import Optional, Union
+
+from deltachat import Chat
+
+from .broadcast import make_spec, send_spec
+from .hookspec import deltabot_hookimpl
+
+
+class Scheduler:
+    """Persistent outbox of messages to be sent at a given time.
+
+    The scheduled messages are saved in the bot's database, so they survive
+    restarts, and are sent in batches by a single timer thread sleeping
+    until the next message is due. Messages that fail to be sent are retried
+    with an exponential backoff, up to `max_attempts` times.
+    """
+
+    def __init__(self, bot, batch_size: int = 100) -> None:
+        self.bot = bot
+        self.logger = bot.logger
+        #: maximum number of due messages fetched at once
+        self.batch_size = batch_size
+        #: number of times a message is tried before it is dropped
+        self.max_attempts = 5
+        #: seconds before the first retry of a failed message, doubled on
+        #: every following failure
+        self.retry_backoff = 60.0
+        self.sent = 0
+        self.failed = 0
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        self._lock = threading.Lock()
+
+    def _get_db(self):
+        return self.bot.plugins._pm.get_plugin(name="db")
+
+    def schedule(
+        self,
+        chat: Union[Chat, int],
+        send_at: Union[datetime, float],
+        text: str = None,
+        **kwargs,
+    ) -> int:
+        """Schedule a message, return its id in the outbox.
+
+        :param chat: the chat or chat id where the message will be sent.
+        :param send_at: a datetime or timestamp of when to send the message.
+        Other arguments are the same as :meth:`simplebot.bot.Replies.add`.
+        """
+        if isinstance(send_at, datetime):
+            send_at = send_at.timestamp()
+        spec = make_spec(self.bot.account, text, **kwargs)
+        chat_id = chat if isinstance(chat, int) else chat.id
+        msg_id = self._get_db().add_scheduled(send_at, chat_id, json.dumps(spec))
+        self.logger.debug(f"message {msg_id} scheduled to chat {chat_id} at {send_at}")
+        self._wakeup.set()
+        return msg_id
+
+    def cancel(self, msg_id: int) -> bool:
+        """Remove a scheduled message, return False if it was already sent."""
+        return self._get_db().delete_scheduled([msg_id]) > 0
+
+    def run_due(self, now: float = None) -> int:
+        """Send the messages that are due, return how many were sent."""
+        count = 0
+        with self._lock:
+            db = self._get_db()
+            while True:
+                current = now or time.time()
+                rows = db.get_due_scheduled(current, self.batch_size)
+                done = []
+                for row in rows:
+                    try:
+                        send_spec(self.bot, json.loads(row["spec"]), row["chat_id"])
+                    except Exception as ex:
+                        self.failed += 1
+                        attempts = row["attempts"] + 1
+                        if attempts >= self.max_attempts:
+                            self.logger.error(
+                                f"scheduled message {row['id']} dropped after"
+                                f" {attempts} attempts: {ex}"
+                            )
+                            done.append(row["id"])
+                            continue
+                        delay = self.retry_backoff * 2 ** (attempts - 1)
+                        self.logger.warning(
+                            f"scheduled message {row['id']} failed, retrying"
+                            f" in {delay:.0f} seconds: {ex}"
+                        )
+                        db.retry_scheduled(row["id"], current + delay)
+                    else:
+                        self.sent += 1
+                        count += 1
+                        done.append(row["id"])
+                db.delete_scheduled(done)
+                if len(rows) < self.batch_size:
+                    return count
+
+    def get_report(self) -> str:
+        next_at = self._get_db().get_next_scheduled()
+        due = f" next in {max(0, next_at - time.time()):.0f}s" if next_at else ""
+        return (
+            f"Outbox: scheduled={self._get_db().count_scheduled()}{due}"
+            f" sent={self.sent} failed={self.failed}"
+        )
+
+    def _worker(self) -> None:
+        while self._running:
+            try:
+                self.run_due()
+                next_at = self._get_db().get_next_scheduled()
+            except Exception as ex:
+                self.logger.exception(ex)
+                next_at = time.time() + 60
+            timeout = None if next_at is None else max(0, next_at - time.time())
+            self._wakeup.wait(timeout)
+            self._wakeup.clear()
+
+    @deltabot_hookimpl
+    def deltabot_start(self, bot) -> None:  # noqa
+        self._running = True
+        self._thread = threading.Thread(
+            target=self._worker, name="scheduler", daemon=True
+        )
+        self._thread.start()
+
+    @deltabot_hookimpl
+    def deltabot_shutdown(self, bot) -> None:  # noqa
+        self._running = False
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
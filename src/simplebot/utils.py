@@ -1,20 +1,40 @@
 import configparser
+import io
 import logging
 import os
 import re
+import shutil
+import stat
+import sys
+import threading
+import traceback
 from tempfile import NamedTemporaryFile
 from types import SimpleNamespace
-from typing import List, Optional, Tuple
+from typing import Callable, Dict, List, Optional, Set, Tuple
 from urllib.parse import quote, unquote
 
-from deltachat.message import Message, extract_addr
+from deltachat.message import Message, extract_addr, get_viewtype_code_from_name
 from PIL import Image
 from PIL.ImageColor import getcolor, getrgb
 from PIL.ImageOps import grayscale
 
+try:
+    from re import _parser as sre_parse  # type: ignore
+except ImportError:  # python < 3.11
+    import sre_parse  # type: ignore
+
 # disable Pillow debugging to stdout
 logging.getLogger("PIL").setLevel(logging.ERROR)
 
+# chunk size used to copy attachments that can't be copied by the kernel
+COPY_CHUNK_SIZE = 1024 * 1024
+# linux ioctl cloning a file (copy-on-write) in filesystems supporting it
+FICLONE = 0x40049409
+
+
+class HandlerTimeout(Exception):
+    """A command or filter handler didn't finish in the allowed time."""
+
 
 def abspath(path: str) -> str:
     return os.path.abspath(os.path.expanduser(path))
@@ -125,6 +145,252 @@ def image_tint(path: str, tint: str) -> Image:
     return new_image
 
 
+def copy_fileobj(fileobj, path: str) -> None:
+    """Copy the rest of the file object to the given path in constant memory.
+
+    Regular files are cloned (copy-on-write) or copied in the kernel if the
+    platform and the filesystems allow it, other file objects are copied
+    in chunks.
+    """
+    try:
+        src_fd = fileobj.fileno()
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        src_fd = -1
+    with open(path, "wb") as dst:
+        if src_fd >= 0 and stat.S_ISREG(os.fstat(src_fd).st_mode):
+            offset = fileobj.tell()
+            size = os.fstat(src_fd).st_size - offset
+            if _clone_file(src_fd, dst.fileno(), offset) or _sendfile(
+                src_fd, dst.fileno(), offset, size
+            ):
+                return
+        shutil.copyfileobj(fileobj, dst, COPY_CHUNK_SIZE)
+
+
+def _clone_file(src_fd: int, dst_fd: int, offset: int) -> bool:
+    if offset or not sys.platform.startswith("linux"):
+        return False
+    try:
+        import fcntl
+
+        fcntl.ioctl(dst_fd, FICLONE, src_fd)
+    except OSError:
+        return False
+    return True
+
+
+def _sendfile(src_fd: int, dst_fd: int, offset: int, size: int) -> bool:
+    if not hasattr(os, "sendfile"):
+        return False
+    copied = 0
+    try:
+        while copied < size:
+            sent = os.sendfile(dst_fd, src_fd, offset + copied, size - copied)
+            if not sent:
+                break
+            copied += sent
+    except OSError:
+        if copied:
+            raise
+        return False
+    return True
+
+
+def call_with_timeout(func: Callable, timeout: Optional[float], logger, name: str):
+    """Call func() and return its result, raise HandlerTimeout if it hangs.
+
+    The call runs in a watchdog thread, if it doesn't finish after the given
+    amount of seconds its stack is logged and it is abandoned, python threads
+    can't be killed so the stuck call keeps running in the background.
+    If timeout is None or 0, func() is called directly.
+    """
+    if not timeout:
+        return func()
+
+    result: list = []
+
+    def _target() -> None:
+        try:
+            result.append((True, func()))
+        except BaseException as ex:  # noqa
+            result.append((False, ex))
+
+    thread = threading.Thread(target=_target, name=f"handler-{name}", daemon=True)
+    thread.start()
+    thread.join(timeout)
+    if thread.is_alive():
+        frame = sys._current_frames().get(thread.ident)  # noqa
+        stack = "".join(traceback.format_stack(frame)) if frame else "(unknown)\n"
+        logger.error(f"handler {name!r} timed out after {timeout}s, stack:\n{stack}")
+        raise HandlerTimeout(name)
+    success, value = result[0]
+    if not success:
+        raise value
+    return value
+
+
+def levenshtein(a: str, b: str) -> int:
+    """Edit distance between two strings."""
+    if len(a) < len(b):
+        a, b = b, a
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        prev = cur
+    return prev[-1]
+
+
+def _deletes(word: str, depth: int) -> Set[str]:
+    """All the strings obtained deleting up to depth characters from word."""
+    result = {word}
+    frontier = {word}
+    for _ in range(depth):
+        frontier = {w[:i] + w[i + 1 :] for w in frontier for i in range(len(w))}
+        result |= frontier
+    return result
+
+
+class FuzzyIndex:
+    """Symmetric delete index for fast approximate lookups by edit distance.
+
+    Every word is indexed by all its variants with up to max_dist deleted
+    characters, so a lookup only needs a few dict accesses no matter how
+    many words are indexed.
+    """
+
+    def __init__(self, words=(), max_dist: int = 2) -> None:
+        self.max_dist = max_dist
+        self._index: Dict[str, Set[str]] = {}
+        for word in words:
+            self.add(word)
+
+    def add(self, word: str) -> None:
+        for variant in _deletes(word, self.max_dist):
+            self._index.setdefault(variant, set()).add(word)
+
+    def remove(self, word: str) -> None:
+        for variant in _deletes(word, self.max_dist):
+            words = self._index.get(variant)
+            if words is not None:
+                words.discard(word)
+                if not words:
+                    del self._index[variant]
+
+    def search(self, word: str, max_dist: int = None) -> List[Tuple[int, str]]:
+        """Return (distance, word) tuples within max_dist of word, closest first."""
+        if max_dist is None or max_dist > self.max_dist:
+            max_dist = self.max_dist
+        candidates: Set[str] = set()
+        for variant in _deletes(word, max_dist):
+            candidates.update(self._index.get(variant, ()))
+        found = []
+        for cand in candidates:
+            dist = levenshtein(word, cand)
+            if dist <= max_dist:
+                found.append((dist, cand))
+        found.sort()
+        return found
+
+
+def _required_literal(pattern: re.Pattern) -> str:
+    """Longest ASCII literal string any match of the pattern must contain,
+    lowercased.
+
+    Non-ASCII characters are not part of the literal, lower() doesn't keep
+    them as re matches them (ex. a final "Σ" becomes "ς"). Returns an empty
+    string if no such literal could be found.
+    """
+    if not isinstance(pattern.pattern, str):
+        return ""
+    try:
+        parsed = sre_parse.parse(pattern.pattern, pattern.flags)
+    except re.error:
+        return ""
+    best, run = "", ""
+    items = list(parsed)
+    while items:
+        op, av = items.pop(0)
+        if op is sre_parse.LITERAL and av < 128:
+            run += chr(av)
+            continue
+        best = max(best, run, key=len)
+        run = ""
+        if op is sre_parse.SUBPATTERN and not av[1] and not av[2]:
+            # plain group, its contents are part of the sequence
+            items = list(av[3]) + items
+    best = max(best, run, key=len)
+    return best.lower()
+
+
+# non-ASCII letters re.IGNORECASE matches with ASCII ones that lower() keeps
+# or, like "İ", turns into more than one character, applied before lower()
+_ASCII_FOLD = {ord("ı"): "i", ord("ſ"): "s", ord("İ"): "i"}
+
+
+class RegexSet:
+    """A set of regular expressions searched in a single pass over the text.
+
+    The longest literal every match of a pattern must contain is added to an
+    Aho-Corasick automaton, one scan of the text finds the literals present
+    and only the patterns owning them are searched to confirm the match.
+    Patterns without such literal are always searched.
+    """
+
+    def __init__(self, patterns: Dict[str, re.Pattern]) -> None:
+        self._patterns = patterns
+        self._always: List[str] = []
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[str]] = [[]]
+        for key, pattern in patterns.items():
+            literal = _required_literal(pattern)
+            if literal:
+                self._add_literal(literal, key)
+            else:
+                self._always.append(key)
+        self._link()
+
+    def _add_literal(self, literal: str, key: str) -> None:
+        node = 0
+        for char in literal:
+            child = self._goto[node].get(char)
+            if child is None:
+                child = self._goto[node][char] = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = child
+        self._out[node].append(key)
+
+    def _link(self) -> None:
+        queue = list(self._goto[0].values())
+        while queue:
+            node = queue.pop(0)
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def match(self, text: str) -> Set[str]:
+        """Return the keys of the patterns found in the given text."""
+        candidates = set(self._always)
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for char in text.translate(_ASCII_FOLD).lower():
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if out[node]:
+                candidates.update(out[node])
+        patterns = self._patterns
+        return {key for key in candidates if patterns[key].search(text)}
+
+
 def parse_system_title_changed(text: str) -> Optional[tuple]:
     text = text.lower()
     m = re.match(r'group name changed from "(.+)" to ".+" by (.+).', text)
@@ -149,6 +415,7 @@ class StatusUpdateMessage:
         self._serial = serial
         self._dc_msg = instance._dc_msg
         self.id = "UNKNOWN"
+        self._view_type = get_viewtype_code_from_name("text")
         self.chat = instance.chat
         self.account = instance.account
         self.error = ""
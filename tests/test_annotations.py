@@ -0,0 +1,55 @@
+from simplebot.annotations import MessageAnnotations
+
+
+class Message:
+    def __init__(self, text):
+        self.text = text
+
+
+def test_lazy():
+    annotations = MessageAnnotations(Message("hi"), {"upper": lambda m: m.text.upper()})
+    assert "upper" in annotations
+    assert not annotations.is_computed("upper")
+    assert annotations["upper"] == "HI"
+    assert annotations.is_computed("upper")
+    assert annotations.get("unknown", 1) == 1
+
+
+def test_memoized(mocker):
+    calls = []
+
+    def language(message):
+        calls.append(message)
+        return "en"
+
+    def lang_filter(message, replies):
+        """reply with the language."""
+        replies.add(text=message.annotations["language"])
+
+    def observer(message):
+        """use the language too."""
+        assert message.annotations["language"] == "en"
+
+    mocker.bot.annotations.register(name="language", func=language)
+    mocker.bot.filters.register(name="observer", func=observer, tryfirst=True)
+    mocker.bot.filters.register(name="lang_filter", func=lang_filter)
+    assert mocker.get_one_reply("hello").text == "en"
+    assert len(calls) == 1
+
+
+def test_parsers(mocker):
+    msg = mocker.make_incoming_message(
+        "/echo_me hi @bob@example.org. see https://example.org/page"
+    )
+    annotations = mocker.bot.annotations.of(msg)
+    assert annotations is mocker.bot.annotations.of(msg)
+    assert annotations["urls"] == ("https://example.org/page",)
+    assert annotations["mentions"] == ("bob@example.org",)
+    assert annotations["command"] == (
+        "/echo_me",
+        ("hi", "@bob@example.org.", "see", "https://example.org/page"),
+        "hi @bob@example.org. see https://example.org/page",
+    )
+    assert (
+        mocker.bot.annotations.of(mocker.make_incoming_message("hi"))["command"] is None
+    )
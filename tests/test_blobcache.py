@@ -0,0 +1,84 @@
+import io
+import os
+import sqlite3
+
+from simplebot.blobcache import (
+    BlobCache,
+    delete_blobs,
+    find_garbage_blobs,
+    get_referenced_blobs,
+)
+
+
+def test_dedup(tmpdir):
+    cache = BlobCache(max_size=100)
+    path1 = cache.add(io.BytesIO(b"sticker"), "sticker.webp", tmpdir.strpath)
+    path2 = cache.add(io.BytesIO(b"sticker"), "sticker.webp", tmpdir.strpath)
+    assert path1 == path2
+    assert path1.endswith(".webp")
+    assert os.path.basename(path1).startswith("sticker-")
+    assert (cache.hits, cache.misses) == (1, 1)
+    # same content with other name is another blob
+    assert cache.add(io.BytesIO(b"sticker"), "other.webp", tmpdir.strpath) != path1
+    assert len(tmpdir.listdir()) == 2
+
+
+def test_eviction(tmpdir):
+    cache = BlobCache(max_size=10)
+    path1 = cache.add(io.BytesIO(b"x" * 6), "a.txt", tmpdir.strpath)
+    path2 = cache.add(io.BytesIO(b"y" * 6), "b.txt", tmpdir.strpath)
+    # referenced blobs are not evicted
+    assert os.path.exists(path1) and os.path.exists(path2)
+    cache.release(path1)
+    assert not os.path.exists(path1)
+    assert cache.size == 6
+    cache.release(path2)
+    assert os.path.exists(path2)
+
+
+def test_replies(mocker, tmpdir):
+    mocker.bot.outbound.blob_cache = cache = BlobCache(max_size=2**20)
+
+    def sticker(replies):
+        """send a sticker."""
+        replies.add(filename="sticker.webp", bytefile=io.BytesIO(b"sticker"))
+
+    mocker.bot.commands.register(name="/sticker", func=sticker)
+    msg1 = mocker.get_one_reply("/sticker")
+    msg2 = mocker.get_one_reply("/sticker")
+    assert msg1.filename == msg2.filename
+    assert cache.hits == 1
+
+    p = tmpdir.join("doc.pdf")
+    p.write("pdf")
+    mocker.bot.commands.register(
+        name="/doc", func=lambda replies: replies.add(filename=p.strpath), help="doc"
+    )
+    assert (
+        mocker.get_one_reply("/doc").filename == mocker.get_one_reply("/doc").filename
+    )
+    assert cache.hits == 2
+    assert all(entry.refs == 0 for entry in cache._entries.values())
+
+
+def test_referenced_blobs(tmpdir):
+    db_path = tmpdir.join("account.db").strpath
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE msgs (id INTEGER, param TEXT)")
+    conn.execute("CREATE TABLE config (keyname TEXT, value TEXT)")
+    conn.execute(
+        "INSERT INTO msgs VALUES (1, ?)", ("f=$BLOBDIR/doc.pdf\nm=application/pdf",)
+    )
+    conn.execute("INSERT INTO msgs VALUES (2, ?)", ("",))
+    conn.execute("INSERT INTO config VALUES ('selfavatar', '$BLOBDIR/avatar.png')")
+    conn.commit()
+    conn.close()
+    assert get_referenced_blobs(db_path) == {"doc.pdf", "avatar.png"}
+
+    blobdir = tmpdir.mkdir("blobs")
+    for name in ("doc.pdf", "avatar.png", "leaked.png"):
+        blobdir.join(name).write("x")
+    garbage = list(find_garbage_blobs(blobdir.strpath, {"doc.pdf", "avatar.png"}, 0))
+    assert garbage == [(blobdir.join("leaked.png").strpath, 1)]
+    assert delete_blobs(garbage) == (1, 1)
+    assert sorted(os.listdir(blobdir.strpath)) == ["avatar.png", "doc.pdf"]
@@ -0,0 +1,76 @@
+import io
+
+import pytest
+
+
+@pytest.fixture
+def broadcaster(mocker):
+    broadcaster = mocker.bot.broadcaster
+    # run the jobs from the tests instead of the background thread
+    broadcaster.deltabot_shutdown(mocker.bot)
+    return broadcaster
+
+
+def make_chats(mocker, count):
+    return [
+        mocker.make_incoming_message("hi", group=f"group{i}").chat for i in range(count)
+    ]
+
+
+def get_last(chat):
+    return chat.get_messages()[-1]
+
+
+def test_broadcast(mocker, broadcaster):
+    chats = make_chats(mocker, 5)
+    broadcaster.batch_size = 2
+    job_id = mocker.bot.broadcast(
+        chats, "news", filename="news.txt", bytefile=io.BytesIO(b"content")
+    )
+    assert "pending: 0/5" in broadcaster.get_report()
+    broadcaster.run_pending()
+    assert f"#{job_id} done: 5/5 sent=5 failed=0" in broadcaster.get_report()
+    # all messages share the same blob
+    filenames = {get_last(chat).filename for chat in chats}
+    assert len(filenames) == 1
+    assert {get_last(chat).text for chat in chats} == {"news"}
+
+
+def test_resume(mocker, broadcaster):
+    chats = make_chats(mocker, 4)
+    job_id = mocker.bot.broadcast([chat.id for chat in chats], "news")
+    db = mocker.bot.plugins._pm.get_plugin(name="db")
+    # the bot was stopped after sending to the first two chats
+    db.update_broadcast(job_id, 2, 2, 0)
+    broadcaster.run_pending()
+    assert [get_last(chat).text for chat in chats] == ["hi", "hi", "news", "news"]
+    assert "done: 4/4 sent=4" in broadcaster.get_report()
+
+
+def test_command(mocker, broadcaster):
+    mocker.bot.add_admin("alice@example.org")
+    assert mocker.get_one_reply("/broadcast").text == "No broadcasts"
+    job_id = mocker.bot.broadcast(make_chats(mocker, 1), "news")
+    reply = mocker.get_one_reply(f"/broadcast cancel {job_id}")
+    assert f"#{job_id} cancelled: 0/1" in reply.text
+    assert "❌" in mocker.get_one_reply(f"/broadcast cancel {job_id}").text
+
+
+def test_cancel_while_running(mocker, broadcaster):
+    chats = make_chats(mocker, 4)
+    job1 = mocker.bot.broadcast(chats[:2], "first")
+    job2 = mocker.bot.broadcast(chats[2:], "second")
+    send = broadcaster._send
+
+    def cancel_and_send(spec, chat_id):
+        # cancelled after run_pending read the pending jobs
+        broadcaster.cancel(job2)
+        return send(spec, chat_id)
+
+    broadcaster._send = cancel_and_send
+    broadcaster.run_pending()
+    report = broadcaster.get_report()
+    assert f"#{job1} done: 2/2 sent=2" in report
+    assert f"#{job2} cancelled: 0/2 sent=0" in report
+    assert [get_last(chat).text for chat in chats] == ["first", "first", "hi", "hi"]
+    assert not broadcaster._cancelled
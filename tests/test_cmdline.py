@@ -1,5 +1,10 @@
+import json
+import os
+
 import pytest
 
+from simplebot.builtin.db import DBManager
+
 
 def test_general_help(cmd):
     cmd.run_ok(
@@ -69,3 +74,23 @@ class TestPluginManagement:
         )
         out = mycmd.run_ok(["plugin", "--list"])
         assert filename not in out
+
+
+class TestBlobs:
+    def test_gc(self, mycmd, tmpdir):
+        mycmd.run_ok(["blobs"], "*0 unreferenced blob(s)*")
+        blobdir = tmpdir.join("account", "account.db-blobs").strpath
+        for name in ("old1.txt", "old2.txt", "new.txt"):
+            with open(os.path.join(blobdir, name), "w") as f:
+                f.write("x" * 1024)
+        for name in ("old1.txt", "old2.txt"):
+            os.utime(os.path.join(blobdir, name), (0, 0))
+        # the attachment of a scheduled message is kept
+        DBManager(tmpdir.join("account", "bot.db").strpath).add_scheduled(
+            0, 1, json.dumps(dict(filename=os.path.join(blobdir, "old1.txt")))
+        )
+        mycmd.run_ok(["blobs", "--gc", "--dry-run"], "*1 unreferenced blob(s)*")
+        mycmd.run_ok(
+            ["blobs", "--gc", "--batch", "1", "--rate", "100/1"], "*deleted 1*"
+        )
+        assert sorted(os.listdir(blobdir)) == ["new.txt", "old1.txt"]
@@ -1,7 +1,10 @@
+import time
+
 import pytest
 
 from simplebot.bot import Replies
 from simplebot.commands import parse_command_docstring
+from simplebot.utils import FuzzyIndex
 
 
 def test_parse_command_docstring():
@@ -27,6 +30,27 @@ def test_run_help(mocker):
     assert "/help" in reply.html
 
 
+def test_help_cache(mocker):
+    html = mocker.get_one_reply("/help").html
+    assert mocker.get_one_reply("/help").html == html
+    assert len(mocker.bot._help_cache) == 1
+
+    def my_command(replies):
+        """my new command."""
+
+    mocker.bot.commands.register(name="/new_cmd", func=my_command)
+    assert "/new_cmd" in mocker.get_one_reply("/help").html
+    mocker.bot.commands.unregister("/new_cmd")
+    assert "/new_cmd" not in mocker.get_one_reply("/help").html
+
+    mocker.bot.add_preference("lang", "your language")
+    assert "/set" in mocker.get_one_reply("/help").html
+
+    mocker.bot.add_admin("alice@example.org")
+    mocker.get_one_reply("/help")
+    assert len(mocker.bot._help_cache) == 3
+
+
 def test_partial_args(mock_bot):
     def my_command(replies):
         """this command only needs the "replies" argument"""
@@ -55,6 +79,93 @@ def test_register(mock_bot):
     assert "/example" not in mock_bot.commands.dict()
 
 
+def test_timeout(mocker):
+    def slow(replies):
+        """never finishes in time."""
+        time.sleep(2)
+        replies.add(text="too late")
+
+    mocker.bot.commands.register(name="/slow", func=slow, timeout=0.1)
+    reply = mocker.get_one_reply("/slow")
+    assert "timed out" in reply.text
+
+    mocker.bot.commands.default_timeout = 0.1
+    mocker.bot.commands.unregister("/slow")
+    mocker.bot.commands.register(name="/slow", func=slow)
+    reply = mocker.get_one_reply("/slow")
+    assert "timed out" in reply.text
+
+
+def test_timeout_abandoned_generator(mocker):
+    done = []
+
+    def slow(replies):
+        """stream results slowly."""
+        yield "first"
+        time.sleep(0.3)
+        yield "late partial"
+        replies.add(text="too late")
+        done.append(True)
+
+    mocker.bot.commands.register(name="/slow", func=slow, timeout=0.1)
+    msg = mocker.make_incoming_message("/slow")
+    replies = mocker.get_replies(msg=msg)
+    assert [m.text for m in replies] == ["first", "⏱️ command '/slow' timed out"]
+    time.sleep(0.5)
+    # the abandoned generator was stopped and its replies discarded
+    assert not done
+    texts = [m.text for m in msg.chat.get_messages()]
+    assert "late partial" not in texts and "too late" not in texts
+
+
+def test_generator(mocker):
+    sent = []
+
+    def stream(replies):
+        """send partial results."""
+        yield "part 1"
+        sent.extend(replies._sent)
+        yield dict(text="part 2")
+        replies.add(text="part 3")
+
+    mocker.bot.commands.register(name="/stream", func=stream)
+    replies = mocker.get_replies("/stream")
+    assert [msg.text for msg in sent] == ["part 1"]
+    assert [msg.text for msg in replies] == ["part 1", "part 2", "part 3"]
+
+
+def test_fuzzy_index():
+    index = FuzzyIndex(["/help", "/hello", "/set", "/ban", "/unban"])
+    assert index.search("/hepl") == [(2, "/hello"), (2, "/help")]
+    assert index.search("/bann", 1) == [(1, "/ban")]
+    assert not index.search("/xyz", 1)
+    index.remove("/ban")
+    assert not index.search("/bann", 1)
+
+
+def test_suggestions(mocker):
+    def my_command(replies):
+        """my commands example."""
+
+    mocker.bot.commands.register(name="/weather", func=my_command)
+    mocker.bot.commands.register(name="/secret", func=my_command, hidden=True)
+    mocker.bot.commands.register(name="/shutdown", func=my_command, admin=True)
+    assert "did you mean /weather?" in mocker.get_one_reply("/wether").text
+    assert "did you mean" not in mocker.get_one_reply("/secre").text
+    assert "did you mean" not in mocker.get_one_reply("/shutdwn").text
+    mocker.bot.add_admin("alice@example.org")
+    assert "did you mean /shutdown?" in mocker.get_one_reply("/shutdwn").text
+    mocker.bot.commands.unregister("/weather")
+    assert "did you mean" not in mocker.get_one_reply("/wether").text
+
+    # commands of the plugins disabled in the chat are not suggested
+    mocker.bot.commands.register(name="/echo", func=my_command)
+    chat = mocker.make_incoming_message("hi").chat
+    mocker.bot.set_plugin_enabled(chat, my_command.__module__, False)
+    assert mocker.get_one_reply("/echo").text == "unknown command '/echo'"
+    assert mocker.get_one_reply("/ech").text == "unknown command '/ech'"
+
+
 class TestArgParsing:
     @pytest.fixture
     def parse_cmd(self, mocker):
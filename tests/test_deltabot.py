@@ -88,6 +88,56 @@ class TestReplies:
         s = open(l[0].filename, "rb").read()
         assert s == b"bytecontent"
 
+    def test_real_file_content(self, replies, tmpdir):
+        p = tmpdir.join("video.mp4")
+        p.write_binary(b"header" + b"x" * 3 * 1024 * 1024)
+        bytefile = open(p.strpath, "rb")
+        # copied from the current position
+        bytefile.read(6)
+        replies.add(filename="video.mp4", bytefile=bytefile)
+
+        l = replies.send_reply_messages()
+        assert bytefile.closed
+        with open(l[0].filename, "rb") as f:
+            assert f.read() == b"x" * 3 * 1024 * 1024
+
+    def test_coalesce(self, mock_bot, mocker):
+        replies = Replies(
+            mocker.make_incoming_message("0"), mock_bot.logger, mock_bot.outbound
+        )
+        mock_bot.outbound.coalesce_limit = 20
+        replies.add(text="hello")
+        replies.add(text="world")
+        replies.add(text="not merged", coalesce=False)
+        replies.add(text="html", html="<b>html</b>")
+        replies.add(text="a" * 10)
+        replies.add(text="b" * 10)
+        l = replies.send_reply_messages()
+        assert [msg.text for msg in l] == [
+            "hello\n\nworld",
+            "not merged",
+            "html",
+            "a" * 10,
+            "b" * 10,
+        ]
+
+    def test_coalesce_exclude(self, mock_bot, mocker):
+        replies = Replies(
+            mocker.make_incoming_message("0"), mock_bot.logger, mock_bot.outbound
+        )
+        mock_bot.outbound.coalesce_limit = 100
+        mock_bot.outbound.coalesce_exclude = frozenset(["myplugin"])
+        replies.add(text="hello")
+        replies.add(text="world")
+        replies.plugin = "myplugin"
+        replies.add(text="menu")
+        replies.add(text="entry")
+        replies.plugin = "other"
+        replies.add(text="a")
+        replies.add(text="b")
+        l = replies.send_reply_messages()
+        assert [msg.text for msg in l] == ["hello\n\nworld", "menu", "entry", "a\n\nb"]
+
     def test_chat_incoming_default(self, replies):
         replies.add(text="hello")
         l = replies.send_reply_messages()
@@ -102,3 +152,74 @@ class TestReplies:
         assert len(l) == 1
         assert l[0].text == "this"
         assert l[0].chat.id == chat.id
+
+    def test_flush(self, replies):
+        replies.add(text="hello")
+        l = replies.flush()
+        assert len(l) == 1
+        assert l[0].text == "hello"
+        assert not replies.has_replies()
+        replies.add(text="world")
+        l = replies.send_reply_messages()
+        assert [msg.text for msg in l] == ["hello", "world"]
+
+
+class TestChatGate:
+    class QueueRecorder:
+        def __init__(self):
+            self.queued = []
+
+        def put_msg(self, msg):
+            self.queued.append(msg)
+
+        def get_msgs(self):
+            return []
+
+    def put(self, mocker, text, **kwargs):
+        handler = mocker.bot._eventhandler
+        # the bot's event worker must not consume the queued messages
+        handler.db = db = self.QueueRecorder()
+        msg = mocker.make_incoming_message(text, **kwargs)
+        handler.ac_incoming_message(msg)
+        return bool(db.queued)
+
+    def test_commands(self, mocker):
+        chat = mocker.make_incoming_message("hi", group="mygroup").chat
+        assert self.put(mocker, "hello", group=chat)
+        mocker.bot.set_chat_gate(chat, "commands")
+        assert not self.put(mocker, "hello", group=chat)
+        assert self.put(mocker, "/help", group=chat)
+        # other chats are not affected
+        assert self.put(mocker, "hello")
+
+    def test_muted(self, mocker):
+        chat = mocker.make_incoming_message("hi", group="mygroup").chat
+        mocker.bot.set_chat_gate(chat.id, "muted")
+        assert not self.put(mocker, "/help", group=chat)
+        mocker.bot.add_admin("alice@example.org")
+        assert self.put(mocker, "/help", group=chat)
+        assert not self.put(mocker, "hello", group=chat)
+        mocker.bot.set_chat_gate(chat, None)
+        assert self.put(mocker, "hello", group=chat)
+
+    def test_system_messages(self, mocker):
+        chat = mocker.make_incoming_message("hi", group="mygroup").chat
+        mocker.bot.set_chat_gate(chat, "muted")
+        handler = mocker.bot._eventhandler
+        handler.db = db = self.QueueRecorder()
+        msg = mocker.make_incoming_message(
+            'Group name changed from "mygroup" to "new" by alice@example.org.',
+            group=chat,
+        )
+        msg.is_system_message = lambda: True
+        handler.ac_incoming_message(msg)
+        assert db.queued == [msg.id]
+
+    def test_gate_command(self, mocker):
+        mocker.bot.add_admin("alice@example.org")
+        msg = mocker.make_incoming_message("hi", group="mygroup")
+        assert mocker.get_one_reply("/gate commands", group=msg.chat).text == (
+            "Gate: commands"
+        )
+        assert mocker.bot.get_chat_gate(msg.chat) == "commands"
+        assert "❌" in mocker.get_one_reply("/gate invalid", group=msg.chat).text
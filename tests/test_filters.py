@@ -1,5 +1,11 @@
+import re
+import threading
+import time
+
 import pytest
 
+from simplebot.utils import RegexSet
+
 
 def hitchhiker(message, replies):
     """my incoming message filter example."""
@@ -18,6 +24,199 @@ def test_register(mock_bot):
     assert "hitchhiker" not in mock_bot.filters.dict()
 
 
+def test_chain(mocker, monkeypatch):
+    calls = []
+
+    def first(message):
+        """first filter."""
+        calls.append("first")
+
+    def admin_only(message):
+        """admin filter."""
+        calls.append("admin")
+
+    def last(message):
+        """last filter."""
+        calls.append("last")
+
+    mocker.bot.filters.register(name="last", func=last, trylast=True)
+    mocker.bot.filters.register(name="first", func=first, tryfirst=True)
+    is_admin_calls = []
+    orig_is_admin = mocker.bot.is_admin
+    monkeypatch.setattr(
+        mocker.bot, "is_admin", lambda addr: is_admin_calls.append(addr)
+    )
+    mocker.get_replies("hello")
+    assert calls == ["first", "last"]
+    assert not is_admin_calls  # no admin filters, no need to check
+
+    monkeypatch.setattr(mocker.bot, "is_admin", orig_is_admin)
+    mocker.bot.filters.register(name="admin", func=admin_only, admin=True)
+    calls.clear()
+    mocker.get_replies("hello")
+    assert calls == ["first", "last"]
+    mocker.bot.add_admin("alice@example.org")
+    calls.clear()
+    mocker.get_replies("hello")
+    assert calls == ["first", "admin", "last"]
+
+    mocker.bot.filters.unregister("admin")
+    calls.clear()
+    mocker.get_replies("hello")
+    assert calls == ["first", "last"]
+
+
+def test_predicates(mocker):
+    calls = []
+
+    def make_filter(name, **kwargs):
+        def func(message):
+            calls.append(name)
+
+        mocker.bot.filters.register(name=name, func=func, help=name, **kwargs)
+
+    make_filter("image", viewtype="image")
+    make_filter("media", viewtype=("image", "video"))
+    make_filter("group", chat_type="group")
+    make_filter("single", chat_type="single")
+    make_filter("url", regex=r"https?://")
+    make_filter("file", has_file=True)
+    make_filter("long", min_len=10)
+
+    mocker.get_replies("hi")
+    assert calls == ["single"]
+    calls.clear()
+    mocker.get_replies("see https://example.org", group="mockgroup")
+    assert calls == ["group", "url", "long"]
+    calls.clear()
+    mocker.get_replies("hi", filename="photo.jpg", viewtype="image")
+    assert calls == ["image", "media", "single", "file"]
+
+    with pytest.raises(ValueError):
+        make_filter("invalid", chat_type="channel")
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "",
+        "foo bar",
+        "Hello http://example.org",
+        "aa ushers",
+        "KIſſ me",
+        "end",
+        "İstanbul",
+        "İstanbul rocks",
+        "İx",
+        "ı",
+        "ſ",
+        "ΟΣ",
+    ],
+)
+def test_regex_set(text):
+    patterns = {
+        "plain": re.compile("foo"),
+        "lookahead": re.compile("(?=bar)ba"),
+        "backref": re.compile(r"(\w)\1"),
+        "nocase": re.compile("HELLO|kiss", re.IGNORECASE),
+        "dotted": re.compile("istanbul", re.IGNORECASE),
+        "cs_dotted": re.compile("İstanbul"),
+        "cs_dotted_short": re.compile("İx"),
+        "cs_dotless": re.compile("ı"),
+        "cs_long_s": re.compile("ſ"),
+        "cs_sigma": re.compile("ΟΣ"),
+        "inline": re.compile("(?i)KISS"),
+        "verbose": re.compile("foo  # comment", re.VERBOSE),
+        "url": re.compile(r"https?://\w+"),
+        "overlap1": re.compile("she"),
+        "overlap2": re.compile("hers"),
+        "anchored": re.compile("^end$"),
+    }
+    expected = {key for key, pattern in patterns.items() if pattern.search(text)}
+    assert RegexSet(patterns).match(text) == expected
+
+
+def test_observers(mocker):
+    release = threading.Event()
+    observed = []
+
+    def stats(message, replies):
+        """slow observer."""
+        release.wait(timeout=10)
+        observed.append(message.text)
+        replies.add(text="observed")
+
+    def claim(message, replies):
+        """claims everything."""
+        replies.add(text="claimed")
+        return True
+
+    mocker.bot.filters.register(name="claim", func=claim, tryfirst=True)
+    mocker.bot.filters.register(name="stats", func=stats, observe=True)
+    # the reply doesn't wait for the observer
+    assert mocker.get_one_reply("hello").text == "claimed"
+    assert not observed
+    release.set()
+    mocker.bot.filters._observer_pool.shutdown(wait=True)
+    assert observed == ["hello"]
+
+
+def test_adaptive_order(mocker):
+    calls = []
+
+    def slow_rare(message):
+        """expensive, never claims."""
+        calls.append("slow_rare")
+        time.sleep(0.01)
+
+    def cheap_common(message):
+        """cheap, claims everything."""
+        calls.append("cheap_common")
+        return True
+
+    filters = mocker.bot.filters
+    filters.adaptive_interval = 2
+    filters.register(name="slow_rare", func=slow_rare)
+    filters.register(name="cheap_common", func=cheap_common)
+    filters.register(name="keyword", func=cheap_common, regex="never")
+    mocker.get_replies("one")
+    assert calls == ["slow_rare", "cheap_common"]
+    regex_set = filters._regex_set
+    calls.clear()
+    mocker.get_replies("two")
+    mocker.get_replies("three")
+    assert calls == ["cheap_common"] * 2
+    report = filters.get_report()
+    assert report.index("cheap_common") < report.index("slow_rare")
+    assert "adaptive" in report
+    # reordering doesn't compile the regex set again, registering does
+    assert filters._regex_set is regex_set
+    filters.unregister("keyword")
+    filters.get_report()
+    assert filters._regex_set is not regex_set
+
+
+def test_report_command(mocker):
+    mocker.bot.add_admin("alice@example.org")
+    reply = mocker.get_one_reply("/filters")
+    assert reply.text.startswith("Filters (fixed order)")
+
+
+def test_timeout(mocker):
+    def slow(message, replies):
+        """never finishes in time."""
+        time.sleep(2)
+
+    def fallback(replies):
+        """should not be reached."""
+        replies.add(text="fallback")
+
+    mocker.bot.filters.register(name="slow", func=slow, timeout=0.1)
+    mocker.bot.filters.register(name="fallback", func=fallback, trylast=True)
+    reply = mocker.get_one_reply("hello")
+    assert "timed out" in reply.text
+
+
 def test_simple_filter(bot_tester):
     bot_tester.bot.filters.register(name="hitchhiker", func=hitchhiker)
     msg_reply = bot_tester.send_command("hello 42")
@@ -0,0 +1,47 @@
+from simplebot.latency import LatencyTracker, percentiles
+
+
+def test_percentiles():
+    assert percentiles([0.5]) == [0.5, 0.5, 0.5]
+    values = [i / 100 for i in range(100, 0, -1)]
+    assert percentiles(values) == [0.5, 0.9, 0.99]
+
+
+def test_bounded():
+    tracker = LatencyTracker(max_samples=3)
+    for msg_id in range(10):
+        tracker.arrived(msg_id)
+        tracker.sent(msg_id, 100 + msg_id, "plugin", "1:1")
+    # untracked messages are ignored
+    tracker.sent(1000, 2000, "plugin", "1:1")
+    tracker.delivered(2000)
+    assert list(tracker._incoming) == [7, 8, 9]
+    assert list(tracker._outgoing) == [107, 108, 109]
+    for msg_id in range(100, 110):
+        tracker.delivered(msg_id)
+    assert len(tracker._samples) == 3
+    assert not tracker._outgoing
+
+
+def test_track_replies(mocker):
+    def ping(replies):
+        """reply pong."""
+        replies.add(text="pong")
+
+    tracker = LatencyTracker()
+    mocker.bot.outbound.latency = tracker
+    mocker.bot.commands.register(name="/ping", func=ping)
+    msg = mocker.make_incoming_message("/ping")
+    tracker.arrived(msg.id)
+    tracker.processed(msg.id)
+    reply = mocker.get_one_reply(msg=msg)
+    assert tracker._outgoing[reply.id][:2] == (__name__, "1:1")
+    tracker.delivered(reply.id)
+
+    stats = tracker.get_stats()
+    assert set(stats["plugin"]) == {__name__}
+    assert set(stats["chat"]) == {"1:1"}
+    assert set(stats["stage"]) == {"processing", "sending", "delivery", "total"}
+    report = mocker.bot.outbound.get_report()
+    assert "Latency: samples=1 pending=0" in report
+    assert f"plugin {__name__}: " in report
@@ -0,0 +1,103 @@
+import io
+import logging
+import os
+
+from PIL import Image
+
+from simplebot.blobcache import BlobCache
+from simplebot.media import ImageShrinker
+
+logger = logging.getLogger(__name__)
+
+
+def make_image(path, size=(800, 600), fmt="JPEG", mode="RGB"):
+    img = Image.effect_noise(size, 64).convert(mode)
+    img.save(path, fmt)
+    return path
+
+
+def test_downscale(tmp_path):
+    blobdir = str(tmp_path)
+    src = make_image(os.path.join(blobdir, "photo.jpg"))
+    shrinker = ImageShrinker(logger, max_side=200)
+    path = shrinker.process(src, blobdir)
+    assert path != src and path.endswith(".jpg")
+    with Image.open(path) as img:
+        assert img.size == (200, 150)
+        assert img.format == "JPEG"
+    assert shrinker.shrunk == 1
+    assert shrinker.saved > 0
+
+    # the result is cached by content
+    assert shrinker.process(src, blobdir) == path
+    assert shrinker.hits == 1
+    os.remove(path)
+    path2 = shrinker.process(src, blobdir)
+    assert path2 == path and os.path.exists(path2)
+    assert shrinker.shrunk == 2
+
+
+def test_keep(tmp_path):
+    blobdir = str(tmp_path)
+    shrinker = ImageShrinker(logger, max_side=1000, max_bytes=10 * 2**20)
+    src = make_image(os.path.join(blobdir, "small.png"), fmt="PNG", mode="RGBA")
+    assert shrinker.process(src, blobdir) == src
+    assert shrinker.process(src, blobdir) == src
+    assert shrinker.hits == 1
+
+    text = os.path.join(blobdir, "notes.txt")
+    with open(text, "w") as f:
+        f.write("hello")
+    assert shrinker.process(text, blobdir) == text
+
+    broken = os.path.join(blobdir, "broken.jpg")
+    with open(broken, "wb") as f:
+        f.write(b"not an image")
+    assert shrinker.process(broken, blobdir) == broken
+    assert not shrinker.shrunk
+    assert sorted(os.listdir(blobdir)) == ["broken.jpg", "notes.txt", "small.png"]
+
+
+def test_truncated(tmp_path):
+    blobdir = str(tmp_path)
+    src = make_image(os.path.join(blobdir, "photo.jpg"))
+    with open(src, "rb") as f:
+        data = f.read()
+    with open(src, "wb") as f:
+        f.write(data[: len(data) // 2])
+    shrinker = ImageShrinker(logger, max_side=500)
+    assert shrinker.process(src, blobdir) == src
+    assert shrinker.failed == 1
+    assert os.listdir(blobdir) == ["photo.jpg"]
+
+
+def test_replies(mocker):
+    outbound = mocker.bot.outbound
+    outbound.blob_cache = BlobCache(10 * 2**20)
+    outbound.media = ImageShrinker(mocker.bot.logger, max_side=100)
+
+    data = io.BytesIO()
+    Image.effect_noise((400, 400), 64).convert("RGB").save(data, "JPEG")
+
+    def photo(replies):
+        """send a photo."""
+        replies.add(
+            filename="photo.jpg", bytefile=io.BytesIO(data.getvalue()), viewtype="image"
+        )
+
+    def document(replies):
+        """send a photo as a file."""
+        replies.add(filename="photo.jpg", bytefile=io.BytesIO(data.getvalue()))
+
+    mocker.bot.commands.register(name="/photo", func=photo)
+    mocker.bot.commands.register(name="/document", func=document)
+    msg = mocker.get_one_reply("/photo")
+    with Image.open(msg.filename) as img:
+        assert img.size == (100, 100)
+    # images sent as files are not modified
+    msg = mocker.get_one_reply("/document")
+    with Image.open(msg.filename) as img:
+        assert img.size == (400, 400)
+    # the original blob is no longer referenced
+    assert all(entry.refs == 0 for entry in outbound.blob_cache._entries.values())
+    assert "Image shrinker: shrunk=1" in outbound.get_report()
@@ -0,0 +1,81 @@
+from simplebot.ratelimit import SendLimiter
+
+
+def test_synchronous(mocker):
+    assert mocker.get_one_reply("/help")
+    assert mocker.bot.outbound.sent == 0
+
+
+def test_async_order(mocker):
+    def burst(replies):
+        """send several replies."""
+        for i in range(10):
+            replies.add(text=str(i))
+
+    outbound = mocker.bot.outbound
+    outbound.workers = 2
+    mocker.bot.commands.register(name="/burst", func=burst)
+    msg = mocker.make_incoming_message("hi")
+    # processing doesn't wait for the replies to be sent
+    assert not mocker.get_replies("/burst")
+    outbound.join()
+    assert outbound.sent == 10
+    assert not outbound.failed
+    texts = [m.text for m in msg.chat.get_messages() if m.text.isdigit()]
+    assert texts == [str(i) for i in range(10)]
+    assert "sent=10" in outbound.get_report()
+
+
+def test_priority_lane(mocker):
+    def burst(replies):
+        """send several replies to a group."""
+        for i in range(5):
+            replies.add(text=f"group {i}", chat=group)
+
+    def ping(replies):
+        """reply pong."""
+        replies.add(text="pong")
+
+    outbound = mocker.bot.outbound
+    outbound.workers = 1
+    outbound.limiter = SendLimiter(mocker.bot, rate_limit="1/0.2")
+    group = mocker.make_incoming_message("hi", group="mygroup").chat
+    mocker.bot.commands.register(name="/burst", func=burst)
+    mocker.bot.commands.register(name="/ping", func=ping)
+    msg = mocker.make_incoming_message("hi")
+    mocker.get_replies("/burst")
+    mocker.get_replies(msg=mocker.make_incoming_message("/ping"))
+    outbound.join()
+    assert outbound.sent == 6
+    # the 1:1 reply didn't wait for the group replies throttled before it
+    pong = msg.chat.get_messages()[-1]
+    assert pong.text == "pong"
+    group_ids = [m.id for m in group.get_messages() if m.text.startswith("group")]
+    assert len(group_ids) == 5
+    assert pong.id < group_ids[-1]
+
+
+def test_priority_lane_admin(mocker):
+    def burst(replies):
+        """send several replies."""
+        for i in range(5):
+            replies.add(text=f"group {i}")
+
+    def ping(replies):
+        """reply pong."""
+        replies.add(text="pong")
+
+    outbound = mocker.bot.outbound
+    outbound.workers = 1
+    outbound.limiter = SendLimiter(mocker.bot, rate_limit="1/0.2")
+    mocker.bot.add_admin("alice@example.org")
+    group = mocker.make_incoming_message("hi", group="mygroup").chat
+    mocker.bot.commands.register(name="/burst", func=burst)
+    mocker.bot.commands.register(name="/ping", func=ping)
+    mocker.get_replies("/burst", group=group, addr="bob@example.org")
+    mocker.get_replies("/ping", group=group)
+    outbound.join()
+    assert outbound.sent == 6
+    # the admin's reply didn't wait for the group replies throttled before it
+    ids = {m.text: m.id for m in group.get_messages()}
+    assert ids["pong"] < ids["group 4"]
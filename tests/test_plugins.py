@@ -1,8 +1,10 @@
 from queue import Queue
 
 import pluggy
+import pytest
 
 import simplebot
+from simplebot.hookspec import deltabot_hookimpl
 from simplebot.plugins import get_global_plugin_manager
 
 
@@ -63,3 +65,170 @@ def test_deltabot_init_hooks(monkeypatch, request):
     assert q.get(timeout=10) == 1
     bot.start()
     assert q.get(timeout=10) == 2
+
+
+def test_chat_enablement(mocker):
+    calls = []
+
+    def echo(replies):
+        """echo command."""
+        replies.add(text="echo")
+
+    def counter(message):
+        """count calls."""
+        calls.append(message)
+
+    mocker.bot.commands.register(name="/echo", func=echo)
+    mocker.bot.filters.register(name="counter", func=counter)
+    plugin = echo.__module__
+    chat = mocker.make_incoming_message("hi", group="mygroup").chat
+
+    mocker.bot.set_plugin_enabled(chat, plugin, False)
+    assert mocker.bot.get_disabled_plugins(chat) == {plugin}
+    assert not mocker.get_replies("/echo", group=chat)
+    mocker.get_replies("hello", group=chat)
+    assert not calls
+    # other chats are not affected
+    assert mocker.get_one_reply("/echo").text == "echo"
+    mocker.get_replies("hello")
+    assert len(calls) == 1
+
+    mocker.bot.set_plugin_enabled(chat.id, plugin, True)
+    assert not mocker.bot.get_disabled_plugins(chat)
+    assert mocker.get_one_reply("/echo", group=chat).text == "echo"
+    with pytest.raises(ValueError):
+        mocker.bot.set_plugin_enabled(chat, "simplebot.builtin.admin", False)
+
+
+def test_plugins_command(mocker):
+    def echo(replies):
+        """echo command."""
+
+    mocker.bot.commands.register(name="/echo", func=echo)
+    mocker.bot.add_admin("alice@example.org")
+    plugin = echo.__module__
+    assert f"✔️ {plugin}" in mocker.get_one_reply("/plugins").text
+    reply = mocker.get_one_reply(f"/plugins disable {plugin}")
+    assert f"❌ {plugin}" in reply.text
+    assert mocker.bot.get_disabled_plugins(reply.chat) == {plugin}
+
+
+def test_fast_dispatch(mocker):
+    calls = []
+
+    class Plugin:
+        def __init__(self, name, result=None):
+            self.name = name
+            self.result = result
+
+        @deltabot_hookimpl
+        def deltabot_incoming_message(self, message):
+            calls.append(self.name)
+            return self.result
+
+    mocker.bot.plugins.fast_dispatch = True
+    mocker.bot.plugins.add_module("plugin1", Plugin("plugin1", True))
+    mocker.bot.plugins.add_module("plugin2", Plugin("plugin2"))
+    mocker.get_replies("hello")
+    # firstresult: plugin1 claims the message and the filters are not called
+    assert calls == ["plugin2", "plugin1"]
+
+    # the call list is compiled again after the plugins change
+    mocker.bot.plugins.remove("plugin1")
+    calls.clear()
+    assert mocker.get_one_reply("/help")
+    assert calls == ["plugin2"]
+
+    assert (
+        mocker.bot.plugins.call("deltabot_list_settings")
+        == mocker.bot.plugins.hook.deltabot_list_settings()
+    )
+
+
+def test_circuit_breaker(mocker, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(simplebot.plugins.time, "time", lambda: now[0])
+    calls = []
+
+    class Plugin:
+        @deltabot_hookimpl
+        def deltabot_incoming_message(self, message):
+            calls.append(message)
+            raise ValueError("remote API is down")
+
+    plugins = mocker.bot.plugins
+    plugins.breaker_threshold = 2
+    plugins.breaker_backoff = 10
+    plugins.add_module("flaky", Plugin())
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            mocker.get_replies("hello")
+    # the breaker is open, the implementation is skipped
+    assert mocker.get_one_reply("/help")
+    assert len(calls) == 2
+    assert "flaky (deltabot_incoming_message): open" in plugins.get_breakers_report()
+
+    # a failed retry doubles the backoff
+    now[0] += 10
+    with pytest.raises(ValueError):
+        mocker.get_replies("hello")
+    now[0] += 10
+    assert mocker.get_one_reply("/help")
+    assert len(calls) == 3
+
+    # a successful retry closes the breaker
+    now[0] += 10
+    Plugin.deltabot_incoming_message = deltabot_hookimpl(
+        lambda self, message: calls.append(message)
+    )
+    plugins.remove("flaky")
+    plugins.add_module("flaky", Plugin())
+    mocker.get_replies("hello")
+    assert len(calls) == 4
+    assert "flaky (deltabot_incoming_message): closed" in plugins.get_breakers_report()
+    mocker.bot.add_admin("alice@example.org")
+    assert "flaky" in mocker.get_one_reply("/breakers").text
+
+
+def test_handler_circuit_breakers(mocker, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(simplebot.plugins.time, "time", lambda: now[0])
+    calls = []
+
+    def slow(replies):
+        """a slow command."""
+        calls.append("slow")
+        now[0] += 1
+        replies.add(text="slow")
+
+    def broken(message):
+        """always fails."""
+        calls.append("broken")
+        raise ValueError("broken filter")
+
+    def echo(message, replies):
+        """echo the message."""
+        replies.add(text=message.text)
+
+    plugins = mocker.bot.plugins
+    plugins.breaker_threshold = 1
+    plugins.breaker_slow = 0.5
+    mocker.bot.commands.register(name="/slow", func=slow)
+    mocker.bot.filters.register(name="broken", func=broken, tryfirst=True)
+    mocker.bot.filters.register(name="echo", func=echo)
+
+    assert mocker.get_one_reply("/slow").text == "slow"
+    assert not mocker.get_replies("/slow")
+    assert calls == ["slow"]
+    # other commands are not affected
+    assert mocker.get_one_reply("/help")
+
+    # the broken filter doesn't stop the other filters
+    assert mocker.get_one_reply("hello").text == "hello"
+    assert mocker.get_one_reply("hello").text == "hello"
+    assert calls == ["slow", "broken"]
+
+    report = plugins.get_breakers_report()
+    assert f"{__name__} (/slow): open" in report
+    assert f"{__name__} (broken): open" in report
+    assert "commands" not in report and "filters" not in report
@@ -0,0 +1,127 @@
+import threading
+import time
+
+import pytest
+
+from simplebot.ratelimit import SendLimiter, TokenBucket, parse_rate
+
+
+def test_parse_rate():
+    assert parse_rate(None) is None
+    assert parse_rate("") is None
+    assert parse_rate("10/60") == (10, 60.0)
+    assert parse_rate((2, 1)) == (2, 1.0)
+    with pytest.raises(ValueError):
+        parse_rate("0/60")
+
+
+def test_token_bucket():
+    bucket = TokenBucket(2, 10, stamp=0)
+    assert bucket.consume(now=0)
+    assert bucket.consume(now=0)
+    assert not bucket.consume(now=0)
+    assert bucket.wait_time(now=0) == pytest.approx(5)
+    assert bucket.consume(now=5)
+    assert not bucket.consume(now=5)
+
+
+def test_command_rate_limit(mocker):
+    def expensive(replies):
+        """expensive command."""
+        replies.add(text="done")
+
+    mocker.bot.commands.register(name="/expensive", func=expensive, rate_limit="2/60")
+    assert mocker.get_one_reply("/expensive").text == "done"
+    assert mocker.get_one_reply("/expensive").text == "done"
+    assert "Too many requests" in mocker.get_one_reply("/expensive").text
+    # only one notice per window
+    assert not mocker.get_replies("/expensive")
+    # other senders are not affected
+    reply = mocker.get_one_reply("/expensive", addr="bob@example.org")
+    assert reply.text == "done"
+
+
+def test_global_rate_limit(mocker):
+    calls = []
+
+    def counter(message):
+        """count calls."""
+        calls.append(message)
+
+    mocker.bot.filters.register(name="counter", func=counter)
+    mocker.bot.ratelimiter.rate_limit = (1, 60)
+    mocker.get_replies("hello")
+    assert "Too many requests" in mocker.get_one_reply("hello").text
+    assert len(calls) == 1
+
+    mocker.bot.add_admin("alice@example.org")
+    mocker.get_replies("hello")
+    assert len(calls) == 2
+
+
+def test_global_rate_limit_scope(mocker):
+    mocker.bot.ratelimiter.rate_limit = (2, 60)
+    chat = mocker.make_incoming_message("hi", group="mygroup").chat
+    # plain chatter that no handler processes doesn't spend tokens
+    for _ in range(3):
+        assert not mocker.get_replies("just chatting", group=chat)
+    assert mocker.get_one_reply("/help", group=chat)
+    assert mocker.get_one_reply("/help", group=chat)
+    # throttled without posting a notice into the group
+    assert not mocker.get_replies("/help", group=chat)
+    assert "Too many requests" in mocker.get_one_reply("/help").text
+
+
+def test_checkpoint(mock_bot):
+    limiter = mock_bot.ratelimiter
+    assert limiter.allow("key", (2, 60))
+    limiter.checkpoint()
+    db = mock_bot.plugins._pm.get_plugin(name="db")
+    rows = db.get_rate_limits()
+    assert len(rows) == 1
+    assert rows[0][:3] == ("key", 2, 60.0)
+
+    # full buckets are pruned even if they weren't used since the last checkpoint
+    limiter._buckets["key"].stamp -= 60
+    limiter.checkpoint()
+    assert not limiter._buckets
+    assert not db.get_rate_limits()
+
+
+class Chat:
+    def __init__(self, chat_id, group=True):
+        self.id = chat_id
+        self.group = group
+
+    def is_multiuser(self):
+        return self.group
+
+
+def test_send_limiter_per_chat(mocker):
+    limiter = SendLimiter(mocker.bot, chat_rate_limit="1/0.2")
+    msg = mocker.make_incoming_message("hi")
+    assert limiter.acquire(Chat(10), msg) == 0
+    assert limiter.acquire(Chat(11), msg) == 0
+    assert limiter.acquire(Chat(10), msg) > 0.1
+    assert (limiter.sent, limiter.delayed) == (3, 1)
+
+
+def test_send_limiter_priority(mocker):
+    limiter = SendLimiter(mocker.bot, rate_limit="1/0.3")
+    msg = mocker.make_incoming_message("hi")
+    limiter.acquire(Chat(10), msg)
+    order = []
+
+    def send(chat):
+        limiter.acquire(chat, msg)
+        order.append(chat.id)
+
+    group = threading.Thread(target=send, args=(Chat(10),))
+    group.start()
+    time.sleep(0.1)
+    private = threading.Thread(target=send, args=(Chat(11, group=False),))
+    private.start()
+    group.join()
+    private.join()
+    assert order == [11, 10]
+    assert "delayed=2" in limiter.get_report()
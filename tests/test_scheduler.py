@@ -0,0 +1,78 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from simplebot.bot import Replies
+from simplebot.scheduler import Scheduler
+
+
+@pytest.fixture
+def scheduler(mocker):
+    scheduler = mocker.bot.scheduler
+    # run the due messages from the tests instead of the background thread
+    scheduler.deltabot_shutdown(mocker.bot)
+    return scheduler
+
+
+def test_replies_send_at(mocker, scheduler):
+    def remind(replies):
+        """remind me later."""
+        replies.add(text="reminder", send_at=time.time() + 60)
+
+    mocker.bot.commands.register(name="/remind", func=remind)
+    msg = mocker.make_incoming_message("hi")
+    assert not mocker.get_replies("/remind")
+    assert scheduler.run_due() == 0
+    assert scheduler.run_due(now=time.time() + 61) == 1
+    assert msg.chat.get_messages()[-1].text == "reminder"
+    assert "scheduled=0" in scheduler.get_report()
+
+
+def test_persistent(mocker, scheduler):
+    chat = mocker.make_incoming_message("hi", group="mygroup").chat
+    send_at = datetime.now() + timedelta(minutes=1)
+    for i in range(5):
+        mocker.bot.schedule_message(chat, send_at, f"message {i}")
+    msg_id = mocker.bot.schedule_message(chat.id, send_at, "cancelled")
+    assert scheduler.cancel(msg_id)
+    assert not scheduler.cancel(msg_id)
+
+    # a restarted bot finds the pending messages in the database
+    restarted = Scheduler(mocker.bot, batch_size=2)
+    assert "scheduled=5" in restarted.get_report()
+    assert restarted.run_due(now=send_at.timestamp()) == 5
+    texts = [m.text for m in chat.get_messages()[-5:]]
+    assert texts == [f"message {i}" for i in range(5)]
+
+
+def test_no_bot(mocker):
+    replies = Replies(mocker.make_incoming_message("hi"), mocker.bot.logger)
+    with pytest.raises(ValueError):
+        replies.add(text="later", send_at=time.time())
+
+
+def test_retry(mocker, scheduler, monkeypatch):
+    chat = mocker.make_incoming_message("hi").chat
+    now = time.time()
+    mocker.bot.schedule_message(chat, now, "flaky")
+    calls = []
+
+    def send_spec(bot, spec, chat_id):
+        calls.append(spec["text"])
+        raise ValueError("core error")
+
+    monkeypatch.setattr("simplebot.scheduler.send_spec", send_spec)
+    scheduler.max_attempts = 3
+    assert scheduler.run_due(now=now) == 0
+    assert "scheduled=1 next in" in scheduler.get_report()
+    # retried with a backoff
+    assert scheduler.run_due(now=now + 30) == 0
+    assert scheduler.run_due(now=now + 60) == 0
+    assert scheduler.run_due(now=now + 179) == 0
+    assert calls == ["flaky", "flaky"]
+    # dropped after the maximum number of attempts
+    assert scheduler.run_due(now=now + 180) == 0
+    assert calls == ["flaky"] * 3
+    assert "scheduled=0" in scheduler.get_report()
+    assert "failed=3" in scheduler.get_report()